@@ -0,0 +1,319 @@
+"""
+ASGI entry point for production serving (see serve.py).
+
+Request and response bodies are read and written on the event loop, so slow
+uploads and idle keep-alive connections cost no threads. Once a request body
+is complete it is dispatched to the Flask app on a bounded executor chosen by
+route: inference for predictions, db for dashboard queries, web for the rest.
+Predictions hand over to the db executor for their database writes, so a
+slow write never holds an inference thread. When an executor's queue is full
+the request is answered with 429 right away instead of piling up. /api/chat
+is served natively with ChatClient.areply(), so waiting on the LLM holds no
+thread at all.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import flaskapp
+from chat_client import ChatBusyError, build_prompt
+from flaskapp import PREDICT_STEPS, PredictError
+
+logger = logging.getLogger(__name__)
+
+# Which executor serves each (method, path); anything else goes to 'web'
+ROUTE_EXECUTORS = {
+    ('POST', '/api/predict'): 'inference',
+    ('POST', '/api/predict/batch'): 'inference',
+    ('GET', '/api/stats'): 'db',
+    ('GET', '/api/history'): 'db',
+    ('GET', '/api/achievements'): 'db',
+}
+
+MAX_BODY_BYTES = int(float(os.getenv('ASGI_MAX_BODY_MB', 64)) * 1024 * 1024)
+BODY_TOO_LARGE = f'Request body larger than {MAX_BODY_BYTES // (1024 * 1024)} MB'
+
+
+class ExecutorSaturated(Exception):
+    """The executor's workers and queue are all taken"""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before sending the whole body"""
+
+
+class BadRequestBody(Exception):
+    """A request body that won't be read; answered with status"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a hard cap on queued work.
+    At most workers + max_queue tasks are accepted at once; submit() raises
+    ExecutorSaturated beyond that so callers can shed load.
+    """
+
+    def __init__(self, name, workers, max_queue):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix=f'asgi-{name}')
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _done(self, future):
+        self._slots.release()
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ExecutorSaturated(self.name)
+        with self._lock:
+            self.in_flight += 1
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected
+            }
+
+
+def wsgi_environ(scope, body):
+    """Translate an ASGI HTTP scope plus its complete body into a WSGI environ"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def run_wsgi(app, environ):
+    """Run a WSGI app to completion and return (status, headers, body)"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+
+    result = app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+class AsgiApp:
+    """Async front end that shares routes and state with the Flask app from flaskapp.create_app()"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.executors = {
+            'inference': BoundedExecutor('inference',
+                                         os.getenv('ASGI_INFERENCE_WORKERS', 4),
+                                         os.getenv('ASGI_INFERENCE_QUEUE', 16)),
+            'db': BoundedExecutor('db', os.getenv('ASGI_DB_WORKERS', 4), os.getenv('ASGI_DB_QUEUE', 64)),
+            'web': BoundedExecutor('web', os.getenv('ASGI_WEB_WORKERS', 8), os.getenv('ASGI_WEB_QUEUE', 128)),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for executor in self.executors.values():
+                    executor.shutdown()
+                flaskapp.preprocessor.shutdown()
+                flaskapp.upload_writer.flush()
+                if flaskapp.write_behind is not None:
+                    flaskapp.write_behind.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, scope, receive):
+        """Read the whole request body; raises BadRequestBody or ClientDisconnected"""
+        for name, value in scope.get('headers', []):
+            if name == b'content-length':
+                try:
+                    length = int(value)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    raise BadRequestBody('Invalid Content-Length header', 400)
+                if length > MAX_BODY_BYTES:
+                    raise BadRequestBody(BODY_TOO_LARGE, 413)
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise BadRequestBody(BODY_TOO_LARGE, 413)
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    @staticmethod
+    async def _send(send, status, headers, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _send_json(self, send, status, payload, headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        await self._send(send, status, [('Content-Type', 'application/json')] + list(headers), body)
+
+    async def _http(self, scope, receive, send):
+        try:
+            body = await self._read_body(scope, receive)
+        except ClientDisconnected:
+            # Nobody is left to answer
+            return
+        except BadRequestBody as e:
+            await self._send_json(send, e.status, {'error': str(e)})
+            return
+
+        # Routes served natively skip Flask's request hooks, so they record their own request metrics
+        started = time.perf_counter()
+        if scope['method'] == 'POST' and scope['path'] == '/api/chat':
+            status, payload = await self._chat(body)
+            await self._send_json(send, status, payload)
+            flaskapp.observe_request('POST', '/api/chat', status, started)
+            return
+
+        if scope['method'] == 'GET' and scope['path'] == '/api/server/stats':
+            await self._send_json(send, 200, {name: ex.stats() for name, ex in self.executors.items()})
+            return
+
+        if scope['method'] == 'POST' and scope['path'] in PREDICT_STEPS:
+            status = await self._predict(PREDICT_STEPS[scope['path']], wsgi_environ(scope, body), send)
+            flaskapp.observe_request('POST', scope['path'], status, started)
+            return
+
+        executor = self.executors[ROUTE_EXECUTORS.get((scope['method'], scope['path']), 'web')]
+        try:
+            future = executor.submit(run_wsgi, self.wsgi_app, wsgi_environ(scope, body))
+        except ExecutorSaturated:
+            await self._send_json(send, 429, {'error': 'Server is busy - try again shortly'}, [('Retry-After', '1')])
+            return
+
+        status, headers, response_body = await asyncio.wrap_future(future)
+        await self._send(send, status, headers, response_body)
+
+    async def _predict(self, steps, environ, send):
+        """
+        Run a predict route's inference step on the inference executor, then
+        its database step on the db executor. Returns the response status.
+        """
+        classify, record = steps
+
+        def classify_request():
+            with self.wsgi_app.request_context(environ):
+                return classify()
+
+        def record_request(*args):
+            with self.wsgi_app.app_context():
+                return record(*args)
+
+        try:
+            classified = await asyncio.wrap_future(self.executors['inference'].submit(classify_request))
+            # A saturated db executor sheds the request too; a retry is answered from the prediction cache
+            payload = await asyncio.wrap_future(self.executors['db'].submit(record_request, *classified))
+        except ExecutorSaturated:
+            await self._send_json(send, 429, {'error': 'Server is busy - try again shortly'}, [('Retry-After', '1')])
+            return 429
+        except PredictError as e:
+            await self._send_json(send, e.status, {'error': str(e)})
+            return e.status
+        except Exception as e:
+            await self._send_json(send, 500, {'error': str(e)})
+            return 500
+        # Same encoder as the Flask routes' jsonify()
+        body = self.wsgi_app.json.dumps(payload).encode('utf-8')
+        await self._send(send, 200, [('Content-Type', 'application/json')], body)
+        return 200
+
+    async def _chat(self, body):
+        """Same behaviour as the Flask /api/chat route, without holding a thread while the LLM answers"""
+        try:
+            data = json.loads(body)
+            if not flaskapp.CHAT_ENABLED:
+                return 200, {'response': flaskapp.CHAT_NOT_CONFIGURED_REPLY}
+            prompt = build_prompt(data.get('message', ''), data.get('context', {}), data.get('history', []))
+            return 200, {'response': await flaskapp.chat_client.areply(prompt)}
+        except ChatBusyError:
+            return 429, {'response': flaskapp.CHAT_BUSY_REPLY}
+        except TimeoutError as e:
+            logger.warning("Chat timeout: %s", e)
+            return 504, {'response': flaskapp.CHAT_TIMEOUT_REPLY}
+        except Exception:
+            logger.exception("Chat error")
+            return 200, {'response': flaskapp.CHAT_ERROR_REPLY}
+
+
+app = AsgiApp(flaskapp.create_app())
@@ -0,0 +1,113 @@
+import threading
+import queue
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class InferenceBatcher:
+    """
+    Dynamic micro-batching scheduler.
+    Concurrent callers submit single preprocessed images; a background worker
+    groups them into batches of up to max_batch_size (waiting at most
+    max_wait_ms after the first image arrives), runs one forward pass and
+    hands each caller its own row. If any caller passes a quality score, the
+    batch's scores are forwarded as run_batch(images, quality_scores=...).
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=10):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        # Metrics
+        self.batches_run = 0
+        self.images_processed = 0
+        self.largest_batch = 0
+        self.batch_size_counts = {}
+        self.total_wait_ms = 0.0
+        self.total_inference_ms = 0.0
+
+    def _ensure_worker(self):
+        """Start the worker thread on first use"""
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+                self._worker.start()
+
+    def submit(self, image, quality_score=None):
+        """Queue one (224, 224, 3) image and return a Future for its result"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((image, future, time.perf_counter(), quality_score))
+        return future
+
+    def predict(self, image, timeout=None, quality_score=None):
+        """Submit one image and block until its row of the batch is ready"""
+        return self.submit(image, quality_score).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the wait expires"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            futures = [future for _, future, _, _ in batch]
+            quality_scores = [score for _, _, _, score in batch]
+
+            try:
+                images = np.stack([image for image, _, _, _ in batch])
+                if any(score is not None for score in quality_scores):
+                    results = self.run_batch(images, quality_scores=quality_scores)
+                else:
+                    results = self.run_batch(images)
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+
+            finished = time.perf_counter()
+            with self._stats_lock:
+                size = len(batch)
+                self.batches_run += 1
+                self.images_processed += size
+                self.largest_batch = max(self.largest_batch, size)
+                self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+                self.total_wait_ms += sum(started - queued for _, _, queued, _ in batch) * 1000
+                self.total_inference_ms += (finished - started) * 1000
+
+    def stats(self):
+        """Queue depth and batch-size metrics"""
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'batches_run': self.batches_run,
+                'images_processed': self.images_processed,
+                'avg_batch_size': round(self.images_processed / self.batches_run, 2) if self.batches_run else 0,
+                'largest_batch': self.largest_batch,
+                'batch_size_counts': dict(sorted(self.batch_size_counts.items())),
+                'avg_queue_wait_ms': round(self.total_wait_ms / self.images_processed, 2) if self.images_processed else 0,
+                'avg_batch_inference_ms': round(self.total_inference_ms / self.batches_run, 2) if self.batches_run else 0
+            }
@@ -0,0 +1,119 @@
+"""
+Micro-benchmark: vectorized quality module vs the original analyze_image_quality.
+
+Usage:
+    python benchmarks/bench_quality.py                  # synthetic 12 MP photos
+    python benchmarks/bench_quality.py --images samples/ # your own photos
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import quality  # noqa: E402
+
+
+def legacy_analyze_image_quality(img):
+    """The original full-resolution implementation (np.var of pixels as the blur score)"""
+    pixels = np.array(img.convert('L'))
+    brightness = np.mean(pixels)
+    blur_score = np.var(pixels)
+    quality_score = 100
+    if brightness < 50:
+        quality_score -= 30
+    elif brightness > 200:
+        quality_score -= 20
+    if blur_score < 100:
+        quality_score -= 25
+    return {'score': max(0, quality_score), 'brightness': round(brightness, 2), 'blur_score': round(blur_score, 2)}
+
+
+def synthetic_images(count, size):
+    """
+    Synthetic photos with a known sharp/blurred split, cycling through
+    textured sharp, textured blurred and high-contrast blurred (large pixel
+    variance but no edges - the case np.var can't tell from a sharp photo).
+    """
+    rng = np.random.default_rng(0)
+    # Camera shake scales with resolution
+    shake = max(size) / 150
+    images, labels = [], []
+    for i in range(count):
+        kind = i % 3
+        if kind in (0, 1):
+            small = rng.integers(0, 255, size=(size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+            img = Image.fromarray(small).resize(size, Image.BICUBIC)
+            detail = Image.fromarray(rng.integers(0, 255, size=(size[1], size[0]), dtype=np.uint8)).convert('RGB')
+            img = Image.blend(img, detail, 0.3)
+        else:
+            blocks = rng.integers(0, 2, size=(6, 8), dtype=np.uint8) * 255
+            img = Image.fromarray(blocks).resize(size, Image.NEAREST).convert('RGB')
+        blurred = kind != 0
+        if blurred:
+            img = img.filter(ImageFilter.GaussianBlur(radius=shake))
+        images.append(img)
+        labels.append(blurred)
+    return images, labels
+
+
+def load_images(directory):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp')):
+            with Image.open(os.path.join(directory, name)) as img:
+                images.append(img.convert('RGB'))
+    return images, None
+
+
+def timed(fn, repeats):
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    return result, float(np.median(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark image quality analysis')
+    parser.add_argument('--images', help='Directory of images (default: synthetic 12 MP images)')
+    parser.add_argument('--count', type=int, default=9)
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.images:
+        images, labels = load_images(args.images)
+    else:
+        images, labels = synthetic_images(args.count, (args.width, args.height))
+    n = len(images)
+
+    legacy, legacy_s = timed(lambda: [legacy_analyze_image_quality(img) for img in images], args.repeats)
+    single, single_s = timed(lambda: [quality.analyze(quality.quality_buffer(img)) for img in images], args.repeats)
+    batch, batch_s = timed(lambda: quality.analyze_batch(np.stack([quality.quality_buffer(img) for img in images])),
+                           args.repeats)
+
+    print(f"{n} images")
+    print(f"{'implementation':<22}{'ms/image':>10}")
+    print(f"{'legacy (full-res)':<22}{legacy_s / n * 1000:>10.2f}")
+    print(f"{'quality.analyze':<22}{single_s / n * 1000:>10.2f}")
+    print(f"{'quality.analyze_batch':<22}{batch_s / n * 1000:>10.2f}")
+    print()
+    print(f"{'#':<4}{'legacy score':>13}{'legacy blur':>13}{'new score':>11}{'new blur':>11}{'blurred':>9}")
+    for i, (old, new) in enumerate(zip(legacy, batch)):
+        label = '' if labels is None else ('yes' if labels[i] else 'no')
+        print(f"{i:<4}{old['score']:>13}{old['blur_score']:>13.1f}{new['score']:>11}{new['blur_score']:>11.1f}{label:>9}")
+
+    if labels is not None:
+        legacy_hits = sum((old['blur_score'] < 100) == blurred for old, blurred in zip(legacy, labels))
+        new_hits = sum((new['blur_score'] < quality.BLUR_THRESHOLD) == blurred for new, blurred in zip(batch, labels))
+        print(f"\nBlur detection accuracy - legacy: {legacy_hits}/{n}, new: {new_hits}/{n}")
+
+
+if __name__ == '__main__':
+    main()
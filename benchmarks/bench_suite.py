@@ -0,0 +1,328 @@
+"""
+Benchmark and load-test suite for the prediction and stats paths.
+
+Usage:
+    python benchmarks/bench_suite.py                              # every section
+    python benchmarks/bench_suite.py --sections stages load       # pick sections
+    python benchmarks/bench_suite.py --db-sizes 1000 10000        # quicker DB scaling run
+    python benchmarks/bench_suite.py --real-models                # use the trained .h5 files
+    python benchmarks/compare.py baseline.json latest.json        # diff two runs
+
+Sections:
+    stages      per-stage latency: decode, preprocess, quality, inference, DB write, achievements, stats, history
+    load        end-to-end latency percentiles and throughput of /api/predict and /api/stats under concurrency
+    db_scaling  DB read/write latency as the classifications table grows (default 1k -> 1M rows)
+
+Each run executes in a scratch directory with a fresh database and, unless
+--real-models is given, tiny synthetic stand-in models (synthetic_models.py).
+Results are written as JSON to benchmarks/results/ for compare.py.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_models import random_jpeg, write_models  # noqa: E402
+
+SECTIONS = ['stages', 'load', 'db_scaling']
+CLASSES = ['glass', 'metal', 'paper', 'plastic', 'trash', 'food_waste', 'e_waste', 'textiles', 'hazardous', 'medical']
+
+
+def summarize(seconds):
+    """Latency percentiles in milliseconds"""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        'count': int(len(ms)),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def timed(samples, name, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    samples.setdefault(name, []).append(time.perf_counter() - start)
+    return result
+
+
+def prepare_workspace(args):
+    """Scratch directory with models and a fresh database; returns its path"""
+    workspace = tempfile.mkdtemp(prefix='ecosort-bench-')
+    os.chdir(workspace)
+    if args.real_models:
+        from inference import MODEL1_PATH, MODEL2_PATH
+        for name in (MODEL1_PATH, MODEL2_PATH):
+            shutil.copy(os.path.join(REPO_ROOT, name), name)
+    else:
+        write_models(workspace)
+
+    os.environ.update({
+        'DATABASE_PATH': os.path.join(workspace, 'bench.db'),
+        'MODEL_LOADING': 'lazy',
+        'CHAT_BACKEND': 'fake',
+        'PREDICTION_CACHE': 'true' if args.cache else 'false',
+    })
+    return workspace
+
+
+def bench_stages(app, images, repeats):
+    """Run each stage of the predict path by hand and time it"""
+    from preprocessing import decode_image, to_model_input
+    import quality
+
+    samples = {}
+    for _ in range(repeats):
+        for data in images:
+            img = timed(samples, 'decode', decode_image, data)
+            inputs = timed(samples, 'preprocess', to_model_input, img)
+            quality_check = timed(samples, 'quality', lambda: quality.analyze(quality.quality_buffer(img)))
+            predicted_class, confidence, _, sorted_predictions = timed(
+                samples, 'inference', app.models.classify_batch, inputs[np.newaxis])[0]
+            recyclable, recyclable_confidence, _, eco_score = timed(
+                samples, 'recyclability', app.determine_recyclability, predicted_class, confidence, quality_check['score'])
+            timed(samples, 'db_write', app.db.save_classification, None, predicted_class, confidence,
+                  str(sorted_predictions), recyclable, recyclable_confidence, eco_score,
+                  app.recyclability_rules.version)
+            timed(samples, 'achievements', app.db.check_achievements)
+            timed(samples, 'stats', app.db.get_statistics)
+            timed(samples, 'history', app.db.get_history, 20)
+
+        # Batched inference, reported per image
+        batch = np.stack([to_model_input(decode_image(data)) for data in images[:8]])
+        start = time.perf_counter()
+        app.models.classify_batch(batch)
+        samples.setdefault('inference_batch8_per_image', []).append((time.perf_counter() - start) / len(batch))
+
+    return {name: summarize(values) for name, values in samples.items()}
+
+
+def multipart(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def run_load(base_url, endpoint, images, concurrency, requests):
+    """Fire `requests` calls at `concurrency` and return latency/throughput"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def call(i):
+        if endpoint == 'predict':
+            body, content_type = multipart('file', f'{i}.jpg', images[i % len(images)])
+            request = urllib.request.Request(f'{base_url}/api/predict', data=body,
+                                             headers={'Content-Type': content_type})
+        else:
+            request = urllib.request.Request(f'{base_url}/api/{endpoint}')
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(call, range(requests)))
+    wall = time.perf_counter() - start
+
+    result = summarize(latencies)
+    result.update({
+        'concurrency': concurrency,
+        'throughput_rps': round(requests / wall, 2),
+        'status_counts': statuses,
+    })
+    return result
+
+
+def bench_load(app, images, concurrency_levels, requests, endpoints):
+    """End-to-end load through a real threaded HTTP server"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = {}
+    try:
+        for endpoint in endpoints:
+            run_load(base_url, endpoint, images, 2, 4)  # warm-up
+            results[endpoint] = {
+                f'c{concurrency}': run_load(base_url, endpoint, images, concurrency, requests)
+                for concurrency in concurrency_levels
+            }
+    finally:
+        server.shutdown()
+    return results
+
+
+def fake_rows(rng, count):
+    classes = rng.integers(0, len(CLASSES), size=count)
+    confidences = rng.uniform(20, 100, size=count)
+    return [(None, CLASSES[c], float(conf), '{}', bool(c not in (4, 8, 9)), 80.0, int(conf) % 100, '1')
+            for c, conf in zip(classes, confidences)]
+
+
+def bench_db_scaling(sizes, repeats, chunk_size=50000):
+    """Grow one database through each size and time the read/write paths at every step"""
+    from database import Database
+
+    rng = np.random.default_rng(0)
+    db = Database(os.path.abspath('scaling.db'))
+    db.init_schema()
+    results = {}
+    current = 0
+
+    for size in sorted(sizes):
+        added = max(0, size - current)
+        start = time.perf_counter()
+        while current < size:
+            count = min(chunk_size, size - current)
+            db.save_classifications(fake_rows(rng, count))
+            current += count
+        insert_seconds = time.perf_counter() - start
+
+        samples = {}
+        with db.connection() as conn:
+            middle_id = conn.execute('SELECT MAX(id) / 2 FROM classifications').fetchone()[0]
+        for _ in range(repeats):
+            timed(samples, 'stats', db.get_statistics)
+            timed(samples, 'history_first_page', db.get_history, 20)
+            timed(samples, 'history_deep_page', db.get_history, 20, middle_id)
+            timed(samples, 'history_by_class', db.get_history, 20, None, None, 'glass')
+            timed(samples, 'db_write', db.save_classification, None, 'glass', 90.0, '{}', True, 90, 90)
+            timed(samples, 'achievements', db.check_achievements)
+        current += repeats
+        # The pre-rollup aggregate path, for reference; it scans the whole table so it runs fewer times
+        for _ in range(max(1, repeats // 10)):
+            timed(samples, 'stats_full_scan', db.get_statistics_full_scan)
+
+        results[str(size)] = {
+            'rows': size,
+            'bulk_insert_rows_per_s': round(added / insert_seconds, 1) if added else None,
+            **{name: summarize(values) for name, values in samples.items()}
+        }
+        print(f"   {size:>9,} rows: stats p50 {results[str(size)]['stats']['p50_ms']:.2f} ms, "
+              f"full scan p50 {results[str(size)]['stats_full_scan']['p50_ms']:.2f} ms")
+    db.close()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EcoSort benchmark and load-test suite')
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=SECTIONS)
+    parser.add_argument('--images', type=int, default=16, help='distinct synthetic uploads')
+    parser.add_argument('--image-size', default='1024x768', help='upload resolution WxH')
+    parser.add_argument('--repeats', type=int, default=5, help='passes over the images in the stages section')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=200, help='requests per concurrency level')
+    parser.add_argument('--endpoints', nargs='+', default=['predict', 'stats'], choices=['predict', 'stats', 'history'])
+    parser.add_argument('--db-sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--db-repeats', type=int, default=50)
+    parser.add_argument('--real-models', action='store_true', help='benchmark my_model.h5/waste_model2.h5 instead of stand-ins')
+    parser.add_argument('--cache', action='store_true', help='leave the prediction cache on (off by default)')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/bench-<timestamp>.json)')
+    parser.add_argument('--keep-workspace', action='store_true')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join(
+        REPO_ROOT, 'benchmarks', 'results', f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"))
+    workspace = prepare_workspace(args)
+    print(f"🧪 Workspace: {workspace}")
+
+    import flaskapp
+    # Creates the schema and upload folder in the workspace
+    flask_app = flaskapp.create_app()
+    start = time.perf_counter()
+    flaskapp.models.load()
+    load_seconds = time.perf_counter() - start
+
+    width, height = (int(v) for v in args.image_size.lower().split('x'))
+    rng = np.random.default_rng(0)
+    images = [random_jpeg(rng, (width, height)) for _ in range(args.images)]
+
+    import tensorflow as tf
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'tensorflow': tf.__version__,
+            'models': 'real' if args.real_models else 'synthetic',
+            'model_backend': flaskapp.models.backend,
+            'model_load_seconds': round(load_seconds, 3),
+            'args': vars(args),
+        }
+    }
+
+    if 'stages' in args.sections:
+        print("⏱️  Per-stage latency...")
+        results['stages'] = bench_stages(flaskapp, images, args.repeats)
+        for name, summary in results['stages'].items():
+            print(f"   {name:<28} p50 {summary['p50_ms']:>9.3f} ms   p99 {summary['p99_ms']:>9.3f} ms")
+
+    if 'load' in args.sections:
+        print("🚦 Concurrent load...")
+        results['load'] = bench_load(flask_app, images, args.concurrency, args.requests, args.endpoints)
+        for endpoint, levels in results['load'].items():
+            for level in levels.values():
+                print(f"   {endpoint:<8} c={level['concurrency']:<4} {level['throughput_rps']:>8.1f} req/s   "
+                      f"p50 {level['p50_ms']:>8.2f}  p95 {level['p95_ms']:>8.2f}  p99 {level['p99_ms']:>8.2f} ms   "
+                      f"{level['status_counts']}")
+
+    if 'db_scaling' in args.sections:
+        print("🗄️  Database scaling...")
+        results['db_scaling'] = bench_db_scaling(args.db_sizes, args.db_repeats)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+    flaskapp.upload_writer.flush()
+    if not args.keep_workspace:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
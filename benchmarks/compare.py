@@ -0,0 +1,89 @@
+"""
+Compare two bench_suite.py result files.
+
+Usage:
+    python benchmarks/compare.py baseline.json latest.json
+    python benchmarks/compare.py baseline.json latest.json --threshold 5 --fail-on-regression
+
+Latency metrics (*_ms) are better when lower; throughput metrics
+(throughput_rps, *_per_s) are better when higher. Changes beyond
+--threshold percent in the wrong direction are flagged as regressions.
+"""
+import argparse
+import json
+import sys
+
+
+def flatten(results, prefix=''):
+    """{'stages': {'decode': {'p50_ms': 1}}} -> {'stages.decode.p50_ms': 1}"""
+    metrics = {}
+    for key, value in results.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f'{path}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[path] = value
+    return metrics
+
+
+def direction(path):
+    """-1 if lower is better, 1 if higher is better, None for metrics that aren't compared"""
+    name = path.rsplit('.', 1)[-1]
+    if name.endswith('_ms'):
+        return -1
+    if name == 'throughput_rps' or name.endswith('_per_s'):
+        return 1
+    return None
+
+
+def compare(base, new, threshold):
+    """Rows of (path, base, new, change %, regressed) for metrics present in both runs"""
+    base_metrics = flatten({k: v for k, v in base.items() if k != 'meta'})
+    new_metrics = flatten({k: v for k, v in new.items() if k != 'meta'})
+    rows = []
+    for path in sorted(base_metrics.keys() & new_metrics.keys()):
+        better = direction(path)
+        if better is None or not base_metrics[path]:
+            continue
+        change = (new_metrics[path] - base_metrics[path]) / base_metrics[path] * 100
+        rows.append((path, base_metrics[path], new_metrics[path], change, change * better < -threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help='percent change treated as a regression')
+    parser.add_argument('--only-regressions', action='store_true', help='hide metrics that did not regress')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with status 1 if anything regressed')
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    for label, results in (('base', base), ('new', new)):
+        meta = results.get('meta', {})
+        print(f"{label:>4}: {meta.get('timestamp')}  commit {meta.get('git_commit')}  "
+              f"{meta.get('models')} models  {meta.get('cpu_count')} CPUs")
+
+    rows = compare(base, new, args.threshold)
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"\n{'metric':<{width}} {'base':>12} {'new':>12} {'change':>9}")
+    for path, base_value, new_value, change, regressed in rows:
+        if args.only_regressions and not regressed:
+            continue
+        marker = '  ❌ regression' if regressed else ''
+        print(f"{path:<{width}} {base_value:>12.3f} {new_value:>12.3f} {change:>+8.1f}%{marker}")
+
+    regressions = sum(1 for row in rows if row[4])
+    print(f"\n{'❌' if regressions else '✅'} {regressions} regression(s) beyond {args.threshold:g}% "
+          f"across {len(rows)} compared metrics")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Tiny stand-in models with the same input/output shapes as my_model.h5 and
+waste_model2.h5 (224x224x3 in, 5-way softmax out), so benchmarks run
+without the trained weights. Their latency is far below the real models';
+compare runs against each other, not against production numbers.
+"""
+import os
+
+import numpy as np
+
+
+def build_model(seed, width=8):
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(seed)
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=(224, 224, 3)),
+        tf.keras.layers.Conv2D(width, 3, strides=4, activation='relu'),
+        tf.keras.layers.Conv2D(width * 2, 3, strides=4, activation='relu'),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(5, activation='softmax'),
+    ])
+
+
+def write_models(directory, width=8):
+    """Save both stand-in models under the file names ModelRegistry loads"""
+    from inference import MODEL1_PATH, MODEL2_PATH
+    paths = []
+    for seed, name in enumerate([MODEL1_PATH, MODEL2_PATH]):
+        path = os.path.join(directory, name)
+        build_model(seed, width).save(path)
+        paths.append(path)
+    return paths
+
+
+def random_jpeg(rng, size=(1024, 768), quality=85):
+    """Encode a random smooth-plus-noise photo as JPEG bytes"""
+    import io
+    from PIL import Image
+    small = rng.integers(0, 255, size=(size[1] // 32, size[0] // 32, 3), dtype=np.uint8)
+    img = Image.fromarray(small).resize(size, Image.BICUBIC)
+    noise = Image.fromarray(rng.integers(0, 255, size=(size[1], size[0], 3), dtype=np.uint8))
+    img = Image.blend(img, noise, 0.15)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
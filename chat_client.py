@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from prediction_cache import PredictionCache
+
+CHAT_BACKENDS = ['gemini', 'fake']
+
+SYSTEM_PROMPT = """You are a friendly, encouraging AI Recycling Coach assistant named "Coach".
+Your personality is like a supportive friend who's passionate about the environment.
+
+Key traits:
+- Friendly and encouraging (use emojis appropriately)
+- Educational but not preachy
+- Celebrates user actions
+- Keeps responses under 100 words
+- Uses simple language
+
+Current context:"""
+
+
+class ChatBusyError(Exception):
+    """Every backend slot is taken; the caller should answer with a fallback"""
+
+
+def build_prompt(message, context=None, history=None):
+    """Build the Coach prompt from the user message, the last scan and recent history"""
+    prompt = SYSTEM_PROMPT
+    if context:
+        category = context.get('label', 'unknown').replace('_', ' ')
+        confidence = context.get('confidence', 0)
+        recyclable = context.get('recyclable', False)
+
+        prompt += f"""
+The user just scanned: {category}
+Confidence: {confidence}%
+Recyclable: {'Yes' if recyclable else 'No'}
+"""
+
+    prompt += "\n\nConversation:\n"
+    for msg in (history or [])[-3:]:  # Last 3 messages for context
+        role = "User" if msg['role'] == 'user' else "Coach"
+        prompt += f"{role}: {msg['content']}\n"
+
+    return prompt + f"User: {message}\nCoach:"
+
+
+def normalize_prompt(prompt):
+    """Case- and whitespace-insensitive form of a prompt, used for the cache key"""
+    return re.sub(r'\s+', ' ', prompt).strip().lower()
+
+
+class GeminiBackend:
+    """Google Gemini; the client library is imported on the first request"""
+
+    def __init__(self, api_key, model_name='models/gemini-2.5-flash'):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt, timeout):
+        response = self._get_model().generate_content(prompt, request_options={'timeout': timeout})
+        return response.text
+
+
+class FakeBackend:
+    """
+    Offline stand-in for local development and tests.
+    Answers with a canned reply (or a short echo) after an optional delay.
+    """
+
+    def __init__(self, reply=None, latency=0.0):
+        self.reply = reply
+        self.latency = float(latency)
+        self.calls = 0
+
+    def generate(self, prompt, timeout):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.reply is not None:
+            return self.reply
+        message = prompt.rsplit('User: ', 1)[-1].rsplit('\nCoach:', 1)[0]
+        return f"🤖 (offline coach) You asked: {message}"
+
+
+class ChatClient:
+    """
+    Runs chat backend calls off the request thread.
+    Calls go to a pool of max_concurrency threads; when every slot is busy new
+    prompts are rejected immediately with ChatBusyError instead of queueing
+    behind slow LLM round trips. Callers wait at most `timeout` seconds.
+    Identical prompts already in flight share one backend call, and answers
+    are cached by normalized prompt for cache_ttl seconds.
+    """
+
+    def __init__(self, backend, timeout=15, max_concurrency=4, cache_size=256, cache_ttl=3600):
+        self.backend = backend
+        self.timeout = float(timeout)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix='chat')
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.cache = PredictionCache(max_entries=cache_size, ttl_seconds=cache_ttl, namespace='chat') if cache_size else None
+
+        # Metrics
+        self.requests = 0
+        self.backend_calls = 0
+        self.shared_calls = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.errors = 0
+        self.total_backend_ms = 0.0
+
+    def key(self, prompt):
+        return hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+
+    def _call(self, prompt):
+        started = time.perf_counter()
+        try:
+            return self.backend.generate(prompt, self.timeout)
+        finally:
+            with self._lock:
+                self.total_backend_ms += (time.perf_counter() - started) * 1000
+
+    def _finished(self, key, future):
+        # The slot is held until the backend actually returns, even if the caller gave up
+        self._slots.release()
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.exception() is not None:
+                self.errors += 1
+        if future.exception() is None and self.cache is not None:
+            self.cache.put(self.cache.key_for_digest(key), future.result())
+
+    def submit(self, prompt):
+        """
+        Return (future, cached_reply). Exactly one of them is set.
+        Raises ChatBusyError when every backend slot is taken.
+        """
+        key = self.key(prompt)
+        with self._lock:
+            self.requests += 1
+        if self.cache is not None:
+            cached = self.cache.get(self.cache.key_for_digest(key))
+            if cached is not None:
+                return None, cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared_calls += 1
+                return future, None
+            if not self._slots.acquire(blocking=False):
+                self.rejected += 1
+                raise ChatBusyError('All chat backend slots are busy')
+            future = self._pool.submit(self._call, prompt)
+            self._inflight[key] = future
+            self.backend_calls += 1
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return future, None
+
+    def reply(self, prompt):
+        """Blocking call for WSGI workers: raises ChatBusyError or TimeoutError"""
+        future, cached = self.submit(prompt)
+        if future is None:
+            return cached
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f'Chat backend did not answer within {self.timeout}s')
+
+    async def areply(self, prompt):
+        """Awaitable variant for async servers; the event loop is never blocked"""
+        future, cached = self.submit(prompt)
+        if future is None:
+            return cached
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f'Chat backend did not answer within {self.timeout}s')
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'backend': type(self.backend).__name__,
+                'timeout_s': self.timeout,
+                'max_concurrency': self.max_concurrency,
+                'in_flight': len(self._inflight),
+                'requests': self.requests,
+                'backend_calls': self.backend_calls,
+                'shared_calls': self.shared_calls,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'errors': self.errors,
+                'avg_backend_ms': round(self.total_backend_ms / self.backend_calls, 2) if self.backend_calls else 0
+            }
+        stats['cache'] = self.cache.stats() if self.cache is not None else {'enabled': False}
+        return stats
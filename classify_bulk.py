@@ -0,0 +1,339 @@
+"""
+Offline bulk classification of image directories and archives.
+
+Usage:
+    python classify_bulk.py photos/ --output results.csv
+    python classify_bulk.py audit.zip more.tar.gz --output results.jsonl --insert-db
+    python classify_bulk.py photos/ --output results.parquet --workers 4
+    python classify_bulk.py photos/ --output results.csv --resume   # continue after a crash/Ctrl-C
+
+Uses the same models, preprocessing, quality analysis and recyclability rules
+as the web app. Batches are decoded on a worker pool while the previous batch
+is being classified. Progress is checkpointed to <output>.checkpoint.json
+every --checkpoint-every images; --resume truncates the output back to the
+last checkpoint and skips everything before it. With --insert-db the
+database keeps its own position, committed in the same transaction as the
+rows, so a crash between the insert and the checkpoint file can't insert
+the same images twice.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import tarfile
+import time
+import zipfile
+from itertools import islice
+
+FIELDS = ['source', 'predicted_class', 'confidence', 'source_model', 'recyclable', 'recyclable_confidence',
+          'recyclability_reason', 'eco_score', 'rules_version', 'quality_score', 'blur_score', 'brightness', 'all_predictions', 'error']
+FORMATS = ['csv', 'jsonl', 'parquet']
+PARQUET_PART = re.compile(r'part-(\d{5})\.parquet')
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def iter_sources(inputs, allowed_image):
+    """
+    Yield (name, read) for every image under the inputs, in a stable order.
+    read() returns the file's bytes; it is only called for images that are
+    actually processed, so resuming skips files without reading them.
+    """
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if allowed_image(name):
+                        full_path = os.path.join(root, name)
+                        yield full_path, lambda p=full_path: read_file(p)
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for info in sorted(archive.infolist(), key=lambda i: i.filename):
+                    if not info.is_dir() and allowed_image(info.filename):
+                        yield f'{path}:{info.filename}', lambda i=info: archive.read(i)
+        elif tarfile.is_tarfile(path):
+            # Stream mode: members are read sequentially without seeking or extracting to disk
+            with tarfile.open(path, 'r|*') as archive:
+                for member in archive:
+                    if member.isfile() and allowed_image(member.name):
+                        yield f'{path}:{member.name}', lambda m=member: archive.extractfile(m).read()
+        elif os.path.isfile(path) and allowed_image(path):
+            yield path, lambda p=path: read_file(p)
+        else:
+            print(f"⚠️  Skipping {path}: not an image, directory, zip or tar archive")
+
+
+def chunked(sources, size):
+    """Read sources into lists of (name, bytes) of at most `size` items"""
+    while True:
+        chunk = [(name, read()) for name, read in islice(sources, size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+class CsvResultWriter:
+    def __init__(self, path, state=None):
+        self.path = path
+        if state:
+            # Drop anything written after the last checkpoint
+            os.truncate(path, state['bytes'])
+        self._file = open(path, 'a' if state else 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS)
+        if not state:
+            self._writer.writeheader()
+
+    def write(self, records):
+        self._writer.writerows(records)
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'bytes': os.path.getsize(self.path)}
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlResultWriter(CsvResultWriter):
+    def __init__(self, path, state=None):
+        self.path = path
+        if state:
+            os.truncate(path, state['bytes'])
+        self._file = open(path, 'a' if state else 'w', encoding='utf-8')
+
+    def write(self, records):
+        for record in records:
+            self._file.write(json.dumps(record) + '\n')
+
+
+class ParquetResultWriter:
+    """
+    Writes a Parquet dataset: a directory with one part file per checkpoint.
+    Each part is complete on disk before the checkpoint that covers it is saved.
+    """
+
+    def __init__(self, path, state=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            print("❌ Parquet output needs pyarrow - run `pip install pyarrow`")
+            sys.exit(1)
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self.parts = state['parts'] if state else 0
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            # Only our own part files are removed; anything else in the directory is left alone
+            match = PARQUET_PART.fullmatch(name)
+            if match and int(match.group(1)) >= self.parts:
+                os.remove(os.path.join(path, name))
+        self._pending = []
+
+    def write(self, records):
+        self._pending.extend(records)
+
+    def flush(self):
+        if self._pending:
+            table = self._pa.Table.from_pylist(self._pending, schema=self._schema())
+            self._pq.write_table(table, os.path.join(self.path, f'part-{self.parts:05d}.parquet'))
+            self.parts += 1
+            self._pending = []
+        return {'parts': self.parts}
+
+    def _schema(self):
+        pa = self._pa
+        types = {'confidence': pa.float64(), 'recyclable': pa.bool_(), 'recyclable_confidence': pa.float64(),
+                 'eco_score': pa.int64(), 'quality_score': pa.int64(), 'blur_score': pa.float64(),
+                 'brightness': pa.float64()}
+        return pa.schema([(name, types.get(name, pa.string())) for name in FIELDS])
+
+    def close(self):
+        pass
+
+
+WRITERS = {'csv': CsvResultWriter, 'jsonl': JsonlResultWriter, 'parquet': ParquetResultWriter}
+
+
+def load_checkpoint(path, inputs):
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint['inputs'] != inputs:
+        print(f"❌ {path} was written for different inputs: {checkpoint['inputs']}")
+        sys.exit(1)
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f'{path}.part'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def classify_chunk(app, chunk, batch):
+    """Result records and (row, database row) pairs for one decoded chunk, in input order"""
+    records = [None] * len(chunk)
+    db_rows = []
+    classified = []
+    for row, prediction, quality_check in app.classify_prepared(batch):
+        if prediction is None:
+            records[row] = {'source': chunk[row][0], 'error': quality_check}
+        else:
+            classified.append((row, prediction, quality_check))
+
+    # Recyclability for the whole chunk in one vectorized pass
+    scores = app.score_recyclability([(prediction, quality_check) for _, prediction, quality_check in classified])
+    rules_version = app.recyclability_rules.version
+    for (row, prediction, quality_check), recyclability in zip(classified, scores):
+        name = chunk[row][0]
+        predicted_class, confidence, source_model, sorted_predictions = prediction
+        is_recyclable, recyclable_confidence, reason, eco_score = recyclability
+        records[row] = {
+            'source': name,
+            'predicted_class': predicted_class,
+            'confidence': round(confidence, 2),
+            'source_model': source_model,
+            'recyclable': is_recyclable,
+            'recyclable_confidence': round(recyclable_confidence, 2),
+            'recyclability_reason': reason,
+            'eco_score': eco_score,
+            'rules_version': rules_version,
+            'quality_score': quality_check['score'],
+            'blur_score': quality_check['blur_score'],
+            'brightness': quality_check['brightness'],
+            'all_predictions': json.dumps(sorted_predictions),
+            'error': None
+        }
+        # No image_path: local and archive paths aren't servable uploads
+        db_rows.append((row, (None, predicted_class, confidence, str(sorted_predictions),
+                              is_recyclable, recyclable_confidence, eco_score, rules_version)))
+    return records, db_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify image directories and archives offline')
+    parser.add_argument('inputs', nargs='+', help='directories, zip/tar archives or image files')
+    parser.add_argument('--output', '-o', required=True, help='results file (.csv, .jsonl) or Parquet dataset directory (.parquet)')
+    parser.add_argument('--format', choices=FORMATS, help='output format (default: from the output extension)')
+    parser.add_argument('--batch-size', type=int, default=32, help='images per inference batch')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='decode workers (0 = inline)')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread', help='decode worker type')
+    parser.add_argument('--insert-db', action='store_true', help='also insert results into the classifications table')
+    parser.add_argument('--db', default=None, help='SQLite database for --insert-db (default: DATABASE_PATH)')
+    parser.add_argument('--checkpoint-every', type=int, default=1000,
+                        help='images between checkpoints (also the database transaction size)')
+    parser.add_argument('--resume', action='store_true', help='continue from <output>.checkpoint.json')
+    args = parser.parse_args()
+
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if output_format not in FORMATS:
+        parser.error(f'cannot infer the format of {args.output}; use --format')
+    inputs = [os.path.abspath(path) for path in args.inputs]
+    checkpoint_path = f'{args.output}.checkpoint.json'
+
+    # Only the helpers are used: no app is created, so nothing is written unless --insert-db is given
+    import flaskapp
+    from database import Database
+    from preprocessing import PreprocessingStage
+
+    checkpoint = {'inputs': inputs, 'processed': 0, 'errors': 0, 'output': None}
+    if args.resume and os.path.exists(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path, inputs)
+        print(f"↩️  Resuming after {checkpoint['processed']} images")
+    writer = WRITERS[output_format](args.output, checkpoint['output'])
+
+    db = None
+    db_run = os.path.abspath(checkpoint_path)
+    db_processed = 0
+    if args.insert_db:
+        db = Database(args.db or os.getenv('DATABASE_PATH', 'waste_sorting.db'))
+        db.init_schema()
+        if checkpoint['processed']:
+            db_processed = db.bulk_checkpoint(db_run)
+            if db_processed < checkpoint['processed']:
+                print(f"⚠️  {db.path} only has the first {db_processed} images of this run; "
+                      f"images {db_processed}-{checkpoint['processed']} will not be inserted")
+        else:
+            db.save_classifications([], (db_run, 0))
+
+    print("Loading models...")
+    if not flaskapp.models.wait_until_ready():
+        print("❌ Models failed to load")
+        sys.exit(1)
+
+    stage = PreprocessingStage(workers=args.workers, executor=args.executor, hash_mode=flaskapp.preprocessor.hash_mode)
+    sources = islice(iter_sources(inputs, flaskapp.allowed_image), checkpoint['processed'], None)
+    chunks = chunked(sources, max(1, args.batch_size))
+
+    pending_rows = []
+    pending = next_pending = None
+    since_checkpoint = 0
+    processed = 0
+    started = time.perf_counter()
+
+    def commit():
+        """Make everything so far durable, then advance the checkpoint"""
+        checkpoint['output'] = writer.flush()
+        if db is not None:
+            # Rows and the database's own position commit together; images the database
+            # already has (committed before a crash that lost the checkpoint file) are skipped
+            rows = [row for position, row in pending_rows if position >= db_processed]
+            db.save_classifications(rows, (db_run, max(db_processed, checkpoint['processed'])))
+            pending_rows.clear()
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    try:
+        # Pipeline: the next chunk is read and decoding on the pool while the current one is classified
+        chunk = next(chunks, None)
+        pending = stage.submit([data for _, data in chunk]) if chunk else None
+        while chunk:
+            next_chunk = next(chunks, None)
+            next_pending = stage.submit([data for _, data in next_chunk]) if next_chunk else None
+
+            with pending.result() as batch:
+                records, db_rows = classify_chunk(flaskapp, chunk, batch)
+            writer.write(records)
+            pending_rows.extend((checkpoint['processed'] + row, db_row) for row, db_row in db_rows)
+
+            processed += len(chunk)
+            since_checkpoint += len(chunk)
+            checkpoint['processed'] += len(chunk)
+            checkpoint['errors'] += len(chunk) - len(db_rows)
+            if since_checkpoint >= args.checkpoint_every:
+                commit()
+                since_checkpoint = 0
+
+            elapsed = time.perf_counter() - started
+            print(f"\r📦 {checkpoint['processed']} images | {processed / elapsed:.1f} img/s | "
+                  f"{checkpoint['errors']} errors", end='', flush=True)
+            chunk, pending = next_chunk, next_pending
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted - saving checkpoint (rerun with --resume to continue)")
+    finally:
+        # Release decoded batches that were never classified (shared memory in process mode)
+        for leftover in (pending, next_pending):
+            if leftover is not None:
+                leftover.result().close()
+        commit()
+        writer.close()
+        stage.shutdown()
+
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Classified {processed} images in {elapsed:.1f}s "
+          f"({processed / elapsed if elapsed else 0:.1f} img/s) → {args.output}")
+    if db is not None:
+        new_achievements = db.check_achievements()
+        print(f"🗄️  Inserted into {db.path}" + (f" - {len(new_achievements)} new achievements" if new_achievements else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Convert the Keras models to TFLite and report accuracy vs latency.
+
+Usage:
+    python convert_models.py --quantization float16
+    python convert_models.py --quantization int8 --calibration-dir samples/ --report-dir samples/
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+from tensorflow.keras.preprocessing.image import load_img, img_to_array
+
+from tflite_model import QUANTIZATION_MODES, TFLiteModel, tflite_path
+
+IMAGE_SIZE = (224, 224)
+DEFAULT_MODELS = ['my_model.h5', 'waste_model2.h5']
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+
+
+def load_sample_images(directory, limit):
+    """Load up to `limit` images from a directory tree, preprocessed exactly like /api/predict"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    paths = sorted(paths)[:limit]
+    if not paths:
+        raise SystemExit(f'No images found in {directory}')
+    return np.stack([img_to_array(load_img(p, target_size=IMAGE_SIZE)) / 255.0 for p in paths]).astype(np.float32)
+
+
+def convert(model, quantization, calibration_images=None):
+    """Convert a Keras model to a TFLite flatbuffer with optional post-training quantization"""
+    # The Keras input keeps a dynamic batch dimension, so the interpreter can be resized per batch
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if calibration_images is None:
+            raise SystemExit('int8 quantization needs --calibration-dir')
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        def representative_dataset():
+            for image in calibration_images:
+                yield [np.expand_dims(image, axis=0)]
+
+        converter.representative_dataset = representative_dataset
+        # Keep float32 inputs/outputs so the serving code doesn't change
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    return converter.convert()
+
+
+def time_per_image(predict, images, batch_size, repeats):
+    """Median wall time per image over several full passes"""
+    predict(images[:batch_size])  # warm-up
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(0, len(images), batch_size):
+            predict(images[i:i + batch_size])
+        runs.append((time.perf_counter() - start) / len(images))
+    return float(np.median(runs)) * 1000
+
+
+def compare(keras_model, tflite_model, images, batch_size, repeats):
+    """Accuracy-vs-latency comparison of a converted model against the original"""
+    expected = keras_model.predict(images, batch_size=batch_size, verbose=0)
+    actual = np.concatenate([tflite_model.predict(images[i:i + batch_size])
+                             for i in range(0, len(images), batch_size)])
+    return {
+        'samples': len(images),
+        'top1_agreement': round(float(np.mean(np.argmax(expected, 1) == np.argmax(actual, 1))) * 100, 2),
+        'max_confidence_delta': round(float(np.max(np.abs(np.max(expected, 1) - np.max(actual, 1)))) * 100, 2),
+        'mean_abs_error': round(float(np.mean(np.abs(expected - actual))), 6),
+        'keras_ms_per_image': round(time_per_image(lambda x: keras_model.predict(x, verbose=0), images, batch_size, repeats), 3),
+        'tflite_ms_per_image': round(time_per_image(tflite_model.predict, images, batch_size, repeats), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert EcoSort models to TFLite')
+    parser.add_argument('--models', nargs='+', default=DEFAULT_MODELS, help='Keras .h5 models to convert')
+    parser.add_argument('--quantization', choices=QUANTIZATION_MODES, default='none')
+    parser.add_argument('--calibration-dir', help='Images used to calibrate int8 quantization')
+    parser.add_argument('--calibration-samples', type=int, default=100)
+    parser.add_argument('--output-dir', default='.', help='Where to write the .tflite files')
+    parser.add_argument('--report-dir', help='Sample images for the accuracy-vs-latency report')
+    parser.add_argument('--report-samples', type=int, default=200)
+    parser.add_argument('--report-file', default='conversion_report.json')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    calibration_images = None
+    if args.calibration_dir:
+        calibration_images = load_sample_images(args.calibration_dir, args.calibration_samples)
+    report_images = load_sample_images(args.report_dir, args.report_samples) if args.report_dir else None
+
+    report = {'quantization': args.quantization, 'models': {}}
+    for model_path in args.models:
+        if not os.path.exists(model_path):
+            print(f"⚠️  {model_path} not found - skipping")
+            continue
+
+        print(f"Converting {model_path} ({args.quantization})...")
+        model = load_model(model_path)
+        output_path = tflite_path(model_path, args.quantization, args.output_dir)
+        with open(output_path, 'wb') as f:
+            f.write(convert(model, args.quantization, calibration_images))
+
+        entry = {
+            'output': output_path,
+            'keras_size_mb': round(os.path.getsize(model_path) / 1e6, 2),
+            'tflite_size_mb': round(os.path.getsize(output_path) / 1e6, 2)
+        }
+        print(f"✅ Wrote {output_path} ({entry['keras_size_mb']} MB -> {entry['tflite_size_mb']} MB)")
+
+        if report_images is not None:
+            entry.update(compare(model, TFLiteModel(output_path), report_images, args.batch_size, args.repeats))
+            print(f"   Top-1 agreement: {entry['top1_agreement']}%  "
+                  f"Keras: {entry['keras_ms_per_image']} ms/img  TFLite: {entry['tflite_ms_per_image']} ms/img")
+
+        report['models'][model_path] = entry
+
+    if report_images is not None:
+        with open(args.report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📋 Report written to {args.report_file}")
+
+
+if __name__ == '__main__':
+    main()
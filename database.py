@@ -0,0 +1,505 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Achievement tiers: (id, name, description, classifications required)
+ACHIEVEMENTS = [
+    ('first_scan', 'First Scan', 'Classified your first item!', 1),
+    ('eco_newbie', 'Eco Newbie', 'Classified 10 items', 10),
+    ('recycling_hero', 'Recycling Hero', 'Classified 50 items', 50),
+    ('planet_protector', 'Planet Protector', 'Classified 100 items', 100),
+    ('waste_wizard', 'Waste Wizard', 'Classified 500 items', 500),
+]
+
+# Statements are kept as constants so every pooled connection reuses its prepared copy
+# from sqlite3's per-connection statement cache
+INSERT_CLASSIFICATION = '''INSERT INTO classifications
+                           (image_path, predicted_class, confidence, all_predictions, recyclable, recyclable_confidence, eco_score,
+                            rules_version)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+# Write-behind inserts carry the time the request was made, not the time the batch was flushed
+INSERT_CLASSIFICATION_AT = '''INSERT INTO classifications
+                              (image_path, predicted_class, confidence, all_predictions, recyclable, recyclable_confidence, eco_score,
+                               rules_version, timestamp)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+COUNT_CLASSIFICATIONS = 'SELECT COUNT(*) FROM classifications'
+SELECT_ROLLUP_TOTALS = '''SELECT total, recyclable_count, non_recyclable_count,
+                                 confidence_sum, confidence_count, eco_score_sum, eco_score_count
+                          FROM stats_totals WHERE id = 1'''
+SELECT_ROLLUP_TOTAL = 'SELECT total FROM stats_totals WHERE id = 1'
+SELECT_ROLLUP_BY_CLASS = 'SELECT predicted_class, count FROM stats_by_class WHERE count > 0'
+# Rolling 7 days: whole days from the daily buckets, plus the part of the oldest
+# day that is still inside the window (a timestamp index range scan over one day)
+SELECT_ROLLUP_THIS_WEEK = '''SELECT (SELECT COALESCE(SUM(count), 0) FROM stats_daily
+                                     WHERE day > date('now', '-7 days'))
+                                  + (SELECT COUNT(*) FROM classifications
+                                     WHERE timestamp >= datetime('now', '-7 days')
+                                       AND timestamp < date('now', '-6 days'))'''
+UNLOCK_ACHIEVEMENT = '''INSERT OR IGNORE INTO achievements (achievement_id, name, description, unlocked_at)
+                        VALUES (?, ?, ?, ?)'''
+COUNT_BY_CATEGORY = '''SELECT predicted_class, COUNT(*)
+                       FROM classifications
+                       GROUP BY predicted_class'''
+COUNT_THIS_WEEK = '''SELECT COUNT(*) FROM classifications
+                     WHERE timestamp >= datetime('now', '-7 days')'''
+AVG_CONFIDENCE = 'SELECT AVG(confidence) FROM classifications'
+COUNT_ACHIEVEMENTS = 'SELECT COUNT(*) FROM achievements'
+SELECT_UNLOCKED_ACHIEVEMENT_IDS = 'SELECT achievement_id FROM achievements'
+COUNT_RECYCLABLE = 'SELECT COUNT(*) FROM classifications WHERE recyclable = 1'
+COUNT_NON_RECYCLABLE = 'SELECT COUNT(*) FROM classifications WHERE recyclable = 0'
+AVG_ECO_SCORE = 'SELECT AVG(eco_score) FROM classifications WHERE eco_score IS NOT NULL'
+# Last batch each write-behind writer committed, so statistics can tell committed rows from queued ones
+SAVE_WRITE_BEHIND_PROGRESS = 'INSERT OR REPLACE INTO write_behind_progress (writer, batch) VALUES (?, ?)'
+SELECT_WRITE_BEHIND_PROGRESS = 'SELECT batch FROM write_behind_progress WHERE writer = ?'
+DELETE_WRITE_BEHIND_PROGRESS = 'DELETE FROM write_behind_progress WHERE writer = ?'
+# classify_bulk.py progress, committed together with the rows it covers
+SAVE_BULK_CHECKPOINT = 'INSERT OR REPLACE INTO bulk_checkpoints (run, processed) VALUES (?, ?)'
+SELECT_BULK_CHECKPOINT = 'SELECT processed FROM bulk_checkpoints WHERE run = ?'
+SELECT_HISTORY = '''SELECT id, image_path, predicted_class, confidence, timestamp
+                    FROM classifications'''
+SELECT_ACHIEVEMENTS = '''SELECT achievement_id, name, description, unlocked_at
+                         FROM achievements
+                         ORDER BY unlocked_at DESC'''
+
+
+# Rollup tables keep the dashboard statistics current on every insert/delete,
+# so reading them is O(1) instead of a scan over all classifications
+ROLLUP_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS stats_totals
+       (id INTEGER PRIMARY KEY CHECK (id = 1),
+        total INTEGER NOT NULL DEFAULT 0,
+        recyclable_count INTEGER NOT NULL DEFAULT 0,
+        non_recyclable_count INTEGER NOT NULL DEFAULT 0,
+        confidence_sum REAL NOT NULL DEFAULT 0,
+        confidence_count INTEGER NOT NULL DEFAULT 0,
+        eco_score_sum REAL NOT NULL DEFAULT 0,
+        eco_score_count INTEGER NOT NULL DEFAULT 0)''',
+    '''CREATE TABLE IF NOT EXISTS stats_by_class
+       (predicted_class TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0)''',
+    '''CREATE TABLE IF NOT EXISTS stats_daily
+       (day TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0)''',
+    '''CREATE TRIGGER IF NOT EXISTS classifications_rollup_insert
+       AFTER INSERT ON classifications
+       BEGIN
+           UPDATE stats_totals SET
+               total = total + 1,
+               recyclable_count = recyclable_count + (CASE WHEN NEW.recyclable = 1 THEN 1 ELSE 0 END),
+               non_recyclable_count = non_recyclable_count + (CASE WHEN NEW.recyclable = 0 THEN 1 ELSE 0 END),
+               confidence_sum = confidence_sum + COALESCE(NEW.confidence, 0),
+               confidence_count = confidence_count + (NEW.confidence IS NOT NULL),
+               eco_score_sum = eco_score_sum + COALESCE(NEW.eco_score, 0),
+               eco_score_count = eco_score_count + (NEW.eco_score IS NOT NULL)
+           WHERE id = 1;
+           INSERT INTO stats_by_class (predicted_class, count) VALUES (NEW.predicted_class, 1)
+               ON CONFLICT (predicted_class) DO UPDATE SET count = count + 1;
+           INSERT INTO stats_daily (day, count) VALUES (date(NEW.timestamp), 1)
+               ON CONFLICT (day) DO UPDATE SET count = count + 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS classifications_rollup_delete
+       AFTER DELETE ON classifications
+       BEGIN
+           UPDATE stats_totals SET
+               total = total - 1,
+               recyclable_count = recyclable_count - (CASE WHEN OLD.recyclable = 1 THEN 1 ELSE 0 END),
+               non_recyclable_count = non_recyclable_count - (CASE WHEN OLD.recyclable = 0 THEN 1 ELSE 0 END),
+               confidence_sum = confidence_sum - COALESCE(OLD.confidence, 0),
+               confidence_count = confidence_count - (OLD.confidence IS NOT NULL),
+               eco_score_sum = eco_score_sum - COALESCE(OLD.eco_score, 0),
+               eco_score_count = eco_score_count - (OLD.eco_score IS NOT NULL)
+           WHERE id = 1;
+           UPDATE stats_by_class SET count = count - 1 WHERE predicted_class IS OLD.predicted_class;
+           UPDATE stats_daily SET count = count - 1 WHERE day IS date(OLD.timestamp);
+       END''',
+]
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    (1, [
+        # (timestamp, id) matches the history ordering, so pages are index range scans
+        'CREATE INDEX IF NOT EXISTS idx_classifications_timestamp ON classifications (timestamp, id)',
+        'CREATE INDEX IF NOT EXISTS idx_classifications_class ON classifications (predicted_class, timestamp, id)',
+        'CREATE INDEX IF NOT EXISTS idx_classifications_recyclable ON classifications (recyclable)',
+    ]),
+    (2, [
+        # Upload retention clears references to deleted files by path
+        'CREATE INDEX IF NOT EXISTS idx_classifications_image_path ON classifications (image_path)',
+    ]),
+    (3, [
+        # Version of the recyclability rules table that scored each row (NULL for older rows)
+        'ALTER TABLE classifications ADD COLUMN rules_version TEXT',
+    ]),
+    (4, [
+        '''CREATE TABLE IF NOT EXISTS write_behind_progress
+           (writer TEXT PRIMARY KEY,
+            batch INTEGER NOT NULL)''',
+    ]),
+    (5, [
+        '''CREATE TABLE IF NOT EXISTS bulk_checkpoints
+           (run TEXT PRIMARY KEY,
+            processed INTEGER NOT NULL)''',
+    ]),
+]
+
+
+def migrate(conn):
+    """
+    Apply pending migrations; returns the resulting schema version.
+    Several workers may start on the same database at once, so the version is
+    re-read under BEGIN IMMEDIATE (the write lock) and every step commits
+    together with its version bump.
+    """
+    latest = MIGRATIONS[-1][0]
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version >= latest:
+        return version
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for target, statements in MIGRATIONS:
+            if target > version:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {target}')
+                version = target
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return version
+
+
+def rebuild_rollups(conn):
+    """Recompute every rollup table from a full scan of classifications"""
+    conn.execute('DELETE FROM stats_totals')
+    conn.execute('DELETE FROM stats_by_class')
+    conn.execute('DELETE FROM stats_daily')
+    conn.execute('''INSERT INTO stats_totals
+                    (id, total, recyclable_count, non_recyclable_count,
+                     confidence_sum, confidence_count, eco_score_sum, eco_score_count)
+                    SELECT 1, COUNT(*),
+                           COALESCE(SUM(CASE WHEN recyclable = 1 THEN 1 ELSE 0 END), 0),
+                           COALESCE(SUM(CASE WHEN recyclable = 0 THEN 1 ELSE 0 END), 0),
+                           COALESCE(SUM(confidence), 0), COUNT(confidence),
+                           COALESCE(SUM(eco_score), 0), COUNT(eco_score)
+                    FROM classifications''')
+    conn.execute('''INSERT INTO stats_by_class (predicted_class, count)
+                    SELECT predicted_class, COUNT(*) FROM classifications GROUP BY predicted_class''')
+    conn.execute('''INSERT INTO stats_daily (day, count)
+                    SELECT date(timestamp), COUNT(*) FROM classifications GROUP BY date(timestamp)''')
+
+
+class Database:
+    """
+    SQLite access with a small connection pool.
+    Connections are opened once in WAL mode with tuned pragmas and reused
+    across requests, so there's no per-query connect cost and readers don't
+    block the writer. busy_timeout makes concurrent writers wait instead of
+    failing with 'database is locked'.
+    """
+
+    def __init__(self, path='waste_sorting.db', pool_size=8, busy_timeout_ms=5000,
+                 cache_size_kb=16384, synchronous='NORMAL'):
+        self.path = path
+        self.busy_timeout_ms = int(busy_timeout_ms)
+        self.cache_size_kb = int(cache_size_kb)
+        self.synchronous = synchronous.upper()
+        self._pool = queue.LifoQueue(maxsize=max(1, int(pool_size)))
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000,
+                               check_same_thread=False, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA cache_size=-{self.cache_size_kb}')
+        conn.execute(f'PRAGMA busy_timeout={self.busy_timeout_ms}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; commits on success and rolls back on error"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """Close every idle pooled connection"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def pool_stats(self):
+        return {
+            'path': self.path,
+            'idle_connections': self._pool.qsize(),
+            'pool_size': self._pool.maxsize,
+            'connections_opened': self._opened
+        }
+
+    def init_schema(self):
+        with self.connection() as conn:
+            # Classifications table
+            conn.execute('''CREATE TABLE IF NOT EXISTS classifications
+                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                             image_path TEXT,
+                             predicted_class TEXT,
+                             confidence REAL,
+                             all_predictions TEXT,
+                             recyclable BOOLEAN,
+                             recyclable_confidence REAL,
+                             eco_score INTEGER,
+                             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+
+            # Achievements table
+            conn.execute('''CREATE TABLE IF NOT EXISTS achievements
+                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                             achievement_id TEXT UNIQUE,
+                             name TEXT,
+                             description TEXT,
+                             unlocked_at DATETIME)''')
+
+            for statement in ROLLUP_SCHEMA:
+                conn.execute(statement)
+
+            # Existing databases get their rollups backfilled the first time
+            if conn.execute('SELECT COUNT(*) FROM stats_totals').fetchone()[0] == 0:
+                rebuild_rollups(conn)
+
+            migrate(conn)
+
+    def rebuild_statistics(self):
+        """Backfill/rebuild the statistics rollups from the classifications table"""
+        with self.connection() as conn:
+            rebuild_rollups(conn)
+
+    def save_classification(self, image_path, predicted_class, confidence, all_predictions,
+                            recyclable=None, recyclable_confidence=None, eco_score=None, rules_version=None):
+        """Save classification to database"""
+        with self.connection() as conn:
+            conn.execute(INSERT_CLASSIFICATION,
+                         (image_path, predicted_class, confidence, all_predictions,
+                          recyclable, recyclable_confidence, eco_score, rules_version))
+
+    def save_classifications(self, rows, checkpoint=None):
+        """
+        Bulk-insert classifications in one transaction.
+        rows are (image_path, predicted_class, confidence, all_predictions,
+        recyclable, recyclable_confidence, eco_score, rules_version) tuples.
+        checkpoint is an optional (run, processed) bulk position saved in the same transaction.
+        """
+        with self.connection() as conn:
+            conn.executemany(INSERT_CLASSIFICATION, rows)
+            if checkpoint is not None:
+                conn.execute(SAVE_BULK_CHECKPOINT, checkpoint)
+
+    def bulk_checkpoint(self, run):
+        """Images a classify_bulk.py run has committed to this database (0 if none)"""
+        with self.connection() as conn:
+            row = conn.execute(SELECT_BULK_CHECKPOINT, (run,)).fetchone()
+        return row[0] if row else 0
+
+    def save_batch(self, rows, unlocks=(), progress=None):
+        """
+        Insert timestamped classifications and achievement unlocks in one transaction.
+        rows are save_classifications() tuples with a trailing timestamp; unlocks are
+        (achievement_id, name, description, unlocked_at). progress is an optional
+        (writer, batch number) recorded in the same transaction. Returns the
+        classification total and the set of unlocked achievement ids as of the commit.
+        """
+        with self.connection() as conn:
+            conn.executemany(INSERT_CLASSIFICATION_AT, rows)
+            conn.executemany(UNLOCK_ACHIEVEMENT, unlocks)
+            if progress is not None:
+                conn.execute(SAVE_WRITE_BEHIND_PROGRESS, progress)
+            return self._achievement_state(conn)
+
+    def forget_write_behind_progress(self, writer):
+        """Drop a write-behind writer's progress row once it has shut down"""
+        with self.connection() as conn:
+            conn.execute(DELETE_WRITE_BEHIND_PROGRESS, (writer,))
+
+    def achievement_state(self):
+        """Classification total and the set of unlocked achievement ids"""
+        with self.connection() as conn:
+            return self._achievement_state(conn)
+
+    @staticmethod
+    def _achievement_state(conn):
+        total = conn.execute(SELECT_ROLLUP_TOTAL).fetchone()[0]
+        unlocked = {row[0] for row in conn.execute(SELECT_UNLOCKED_ACHIEVEMENT_IDS)}
+        return total, unlocked
+
+    def check_achievements(self):
+        """Check and unlock new achievements"""
+        new_achievements = []
+        with self.connection() as conn:
+            total = conn.execute(SELECT_ROLLUP_TOTAL).fetchone()[0]
+
+            for ach_id, name, desc, required in ACHIEVEMENTS:
+                if total >= required:
+                    # achievement_id is UNIQUE, so concurrent requests can't unlock twice
+                    cursor = conn.execute(UNLOCK_ACHIEVEMENT, (ach_id, name, desc, datetime.now()))
+                    if cursor.rowcount:
+                        new_achievements.append({'id': ach_id, 'name': name, 'description': desc})
+
+        return new_achievements
+
+    def get_statistics(self, pending=None, writer=None):
+        """
+        Get user statistics from the rollup tables.
+        pending (a write_behind.PendingTotals) adds rows that are queued but not yet committed.
+        With writer, pending is instead called with the last batch that writer committed,
+        read in the same snapshot as the rollups, and returns the PendingTotals to add.
+        """
+        with self.connection() as conn:
+            if writer is not None:
+                # One read transaction, so the progress and the rollups agree
+                conn.execute('BEGIN')
+            (total, recyclable_count, non_recyclable_count, confidence_sum, confidence_count,
+             eco_score_sum, eco_score_count) = conn.execute(SELECT_ROLLUP_TOTALS).fetchone()
+            by_category = dict(conn.execute(SELECT_ROLLUP_BY_CLASS).fetchall())
+            this_week = conn.execute(SELECT_ROLLUP_THIS_WEEK).fetchone()[0]
+            achievements_count = conn.execute(COUNT_ACHIEVEMENTS).fetchone()[0]
+            if writer is not None:
+                progress = conn.execute(SELECT_WRITE_BEHIND_PROGRESS, (writer,)).fetchone()
+                pending = pending(progress[0] if progress else 0)
+
+        if pending is not None:
+            total += pending.total
+            this_week += pending.total
+            recyclable_count += pending.recyclable_count
+            non_recyclable_count += pending.non_recyclable_count
+            confidence_sum += pending.confidence_sum
+            confidence_count += pending.confidence_count
+            eco_score_sum += pending.eco_score_sum
+            eco_score_count += pending.eco_score_count
+            achievements_count += pending.achievements
+            for predicted_class, count in pending.by_category.items():
+                by_category[predicted_class] = by_category.get(predicted_class, 0) + count
+
+        avg_confidence = confidence_sum / confidence_count if confidence_count else 0
+        avg_eco_score = eco_score_sum / eco_score_count if eco_score_count else 0
+        return self._format_statistics(total, by_category, this_week, avg_confidence, achievements_count,
+                                       recyclable_count, non_recyclable_count, avg_eco_score)
+
+    def get_statistics_full_scan(self):
+        """Get user statistics by aggregating the whole classifications table (reference for the rollups)"""
+        with self.connection() as conn:
+            total = conn.execute(COUNT_CLASSIFICATIONS).fetchone()[0]
+            by_category = dict(conn.execute(COUNT_BY_CATEGORY).fetchall())
+            this_week = conn.execute(COUNT_THIS_WEEK).fetchone()[0]
+            avg_confidence = conn.execute(AVG_CONFIDENCE).fetchone()[0] or 0
+            achievements_count = conn.execute(COUNT_ACHIEVEMENTS).fetchone()[0]
+            recyclable_count = conn.execute(COUNT_RECYCLABLE).fetchone()[0] or 0
+            non_recyclable_count = conn.execute(COUNT_NON_RECYCLABLE).fetchone()[0] or 0
+            avg_eco_score = conn.execute(AVG_ECO_SCORE).fetchone()[0] or 0
+
+        return self._format_statistics(total, by_category, this_week, avg_confidence, achievements_count,
+                                       recyclable_count, non_recyclable_count, avg_eco_score)
+
+    @staticmethod
+    def _format_statistics(total, by_category, this_week, avg_confidence, achievements_count,
+                           recyclable_count, non_recyclable_count, avg_eco_score):
+        return {
+            'total': total,
+            'by_category': by_category,
+            'this_week': this_week,
+            'avg_confidence': round(avg_confidence, 2),
+            'achievements_count': achievements_count,
+            'recyclable_count': recyclable_count,
+            'non_recyclable_count': non_recyclable_count,
+            'recyclability_rate': round((recyclable_count / total * 100) if total > 0 else 0, 1),
+            'avg_eco_score': round(avg_eco_score, 1)
+        }
+
+    def get_history(self, limit=20, before_id=None, after_id=None, predicted_class=None, since=None, until=None):
+        """
+        One page of classifications, newest first, using keyset pagination.
+        before_id pages towards older rows and after_id towards newer rows;
+        the cursor row's (timestamp, id) is the boundary, so each page is an
+        index range scan no matter how deep it is.
+        """
+        conditions = []
+        params = []
+        if predicted_class:
+            conditions.append('predicted_class = ?')
+            params.append(predicted_class)
+        if since:
+            conditions.append('timestamp >= ?')
+            params.append(since)
+        if until:
+            conditions.append('timestamp < ?')
+            params.append(until)
+        if before_id is not None:
+            conditions.append('(timestamp, id) < (SELECT timestamp, id FROM classifications WHERE id = ?)')
+            params.append(before_id)
+        if after_id is not None:
+            conditions.append('(timestamp, id) > (SELECT timestamp, id FROM classifications WHERE id = ?)')
+            params.append(after_id)
+
+        # Paging towards newer rows walks the index forwards, then flips back to newest-first
+        order = 'ASC' if after_id is not None and before_id is None else 'DESC'
+        sql = SELECT_HISTORY
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY timestamp {order}, id {order} LIMIT ?'
+        params.append(limit)
+
+        with self.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        if order == 'ASC':
+            rows.reverse()
+
+        return [{
+            'id': row[0],
+            'image_path': row[1],
+            'predicted_class': row[2],
+            'confidence': row[3],
+            'timestamp': row[4]
+        } for row in rows]
+
+    def clear_image_paths(self, paths, chunk_size=500):
+        """Drop references to deleted upload files; returns the number of classifications updated"""
+        paths = list(paths)
+        updated = 0
+        with self.connection() as conn:
+            for start in range(0, len(paths), chunk_size):
+                chunk = paths[start:start + chunk_size]
+                placeholders = ','.join('?' * len(chunk))
+                cursor = conn.execute(f'UPDATE classifications SET image_path = NULL WHERE image_path IN ({placeholders})', chunk)
+                updated += cursor.rowcount
+        return updated
+
+    def get_achievements(self):
+        """All unlocked achievements"""
+        with self.connection() as conn:
+            rows = conn.execute(SELECT_ACHIEVEMENTS).fetchall()
+
+        return [{
+            'id': row[0],
+            'name': row[1],
+            'description': row[2],
+            'unlocked_at': row[3]
+        } for row in rows]
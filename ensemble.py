@@ -0,0 +1,41 @@
+import tensorflow as tf
+
+IMAGE_SHAPE = (224, 224, 3)
+
+
+def build_fused_model(model1, model2=None):
+    """
+    Fuse the ensemble into one graph call.
+    Takes the (N, 224, 224, 3) input once and returns a dict with:
+      probabilities - concatenated model1 + model2 softmax outputs, shape (N, 10)
+      index         - selected class index into the combined label list, shape (N,)
+      confidence    - softmax value of the selected class, shape (N,)
+    Selection matches the Python ensemble: model 1 wins only when its best
+    confidence is strictly higher than model 2's.
+    """
+    num_model1_classes = model1.output_shape[-1]
+
+    @tf.function(input_signature=[tf.TensorSpec(shape=(None,) + IMAGE_SHAPE, dtype=tf.float32)])
+    def fused(images):
+        predictions1 = model1(images, training=False)
+        confidence1 = tf.reduce_max(predictions1, axis=1)
+        index1 = tf.argmax(predictions1, axis=1, output_type=tf.int32)
+
+        if model2 is None:
+            return {'probabilities': predictions1, 'index': index1, 'confidence': confidence1}
+
+        # Both sub-networks are independent in the graph, so TF can run them concurrently
+        predictions2 = model2(images, training=False)
+        confidence2 = tf.reduce_max(predictions2, axis=1)
+        index2 = tf.argmax(predictions2, axis=1, output_type=tf.int32) + num_model1_classes
+
+        use_model1 = confidence1 > confidence2
+        return {
+            'probabilities': tf.concat([predictions1, predictions2], axis=1),
+            'index': tf.where(use_model1, index1, index2),
+            'confidence': tf.where(use_model1, confidence1, confidence2)
+        }
+
+    # Trace once at startup so the first request doesn't pay for graph construction
+    fused.get_concrete_function()
+    return fused
@@ -1,504 +1,638 @@
-from flask import Flask, request, jsonify, render_template
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-import numpy as np
+from flask import Flask, Blueprint, Response, request, jsonify, render_template, g
+import logging
 import os
-import uuid
-import sqlite3
-from datetime import datetime
+import time
 from PIL import Image
 import io
-import google.generativeai as genai
+from datetime import datetime, timezone
+import zipfile
 from dotenv import load_dotenv
+from batching import InferenceBatcher
+from inference import ModelRegistry
+from model_server import RemoteModelRegistry
+from prediction_cache import PredictionCache
+from upload_writer import UploadWriter
+from upload_storage import UploadStorage
+from database import Database
+from recyclability import DEFAULT_RULES_PATH, RecyclabilityRules
+from write_behind import WriteBehindWriter
+import quality
+from preprocessing import PreprocessingStage, decode_image
+from chat_client import CHAT_BACKENDS, ChatBusyError, ChatClient, FakeBackend, GeminiBackend, build_prompt
+from metrics import PREDICTIONS, REGISTRY, STAGE_SECONDS
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure Gemini API
+# Leveled logging; LOG_LEVEL=DEBUG shows per-prediction model outputs (see PREDICTION_LOG_SAMPLE_RATE)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+# Configure Gemini API (the client library is imported on the first chat request)
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if not GEMINI_API_KEY or GEMINI_API_KEY == 'your_gemini_api_key_here':
+GEMINI_CONFIGURED = bool(GEMINI_API_KEY) and GEMINI_API_KEY != 'your_gemini_api_key_here'
+# Chat backend: 'gemini' or 'fake' (offline canned replies for development and tests)
+CHAT_BACKEND = os.getenv('CHAT_BACKEND', 'gemini').lower()
+if CHAT_BACKEND not in CHAT_BACKENDS:
+    raise ValueError(f'Unknown CHAT_BACKEND: {CHAT_BACKEND}')
+if CHAT_BACKEND == 'fake':
+    print("🤖 Chatbot is using the offline fake backend")
+elif not GEMINI_CONFIGURED:
     print("⚠️  WARNING: GEMINI_API_KEY not set! Chatbot will use fallback responses.")
     print("   Set your API key in the .env file")
 else:
     print("✅ Gemini API key loaded successfully")
-    genai.configure(api_key=GEMINI_API_KEY)
-    gemini_model = genai.GenerativeModel('models/gemini-2.5-flash')
 
-app = Flask(__name__)
+# Chat calls run on their own small pool with a hard timeout, so slow LLM
+# round trips can't tie up the workers that serve predictions
+chat_client = ChatClient(
+    FakeBackend(latency=float(os.getenv('CHAT_FAKE_LATENCY', 0))) if CHAT_BACKEND == 'fake'
+    else GeminiBackend(GEMINI_API_KEY, os.getenv('GEMINI_MODEL', 'models/gemini-2.5-flash')),
+    timeout=float(os.getenv('CHAT_TIMEOUT', 15)),
+    max_concurrency=int(os.getenv('CHAT_MAX_CONCURRENCY', 4)),
+    cache_size=int(os.getenv('CHAT_CACHE_SIZE', 256)),
+    cache_ttl=float(os.getenv('CHAT_CACHE_TTL', 3600))
+)
+CHAT_ENABLED = CHAT_BACKEND == 'fake' or GEMINI_CONFIGURED
+
+CHAT_NOT_CONFIGURED_REPLY = "I'm not fully configured yet! Please set your Gemini API key in the .env file to enable AI conversations. For now, try the quick action buttons! 🤖"
+CHAT_BUSY_REPLY = "Lots of people are chatting with me right now! Give me a moment and ask again. 🌱"
+CHAT_TIMEOUT_REPLY = "I'm thinking a bit slowly right now! Please try again in a moment. ⏳"
+CHAT_ERROR_REPLY = "I'm having a bit of trouble right now, but I'm here to help! Try asking me about disposal methods, recycling tips, or your environmental impact! 🌍"
+
 UPLOAD_FOLDER = 'static/uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-# Load models
-print("Loading Model 1 (Original 5 categories)...")
-model1 = load_model('my_model.h5')
-model1_labels = ['glass', 'metal', 'paper', 'plastic', 'trash']
-
-# Try to load Model 2 (New 5 categories)
-try:
-    print("Loading Model 2 (Additional 5 categories)...")
-    model2 = load_model('waste_model2.h5')
-    model2_labels = ['food_waste', 'e_waste', 'textiles', 'hazardous', 'medical']
-    DUAL_MODEL_MODE = True
-    print("✅ Dual-model mode activated!")
-except:
-    print("⚠️  Model 2 not found - using single model mode")
-    model2 = None
-    model2_labels = []
-    DUAL_MODEL_MODE = False
-
-# Combined class labels (10 total)
-class_labels = model1_labels + model2_labels
-print(f"📋 Total categories: {len(class_labels)}")
-
-
-# Initialize database
-def init_db():
-    conn = sqlite3.connect('waste_sorting.db')
-    c = conn.cursor()
+
+# Model loading: 'background' (warm up on a thread), 'lazy' (on first prediction) or 'eager' (before serving)
+MODEL_LOADING = os.getenv('MODEL_LOADING', 'background').lower()
+MODEL_READY_TIMEOUT = float(os.getenv('MODEL_READY_TIMEOUT', 60))
+
+# Models are loaded by the registry, never at import time.
+# With MODEL_SERVER set, the models live in a separate model_server.py process
+# shared by every web worker, and this process never imports TensorFlow.
+MODEL_SERVER = os.getenv('MODEL_SERVER')
+if MODEL_SERVER:
+    models = RemoteModelRegistry(
+        MODEL_SERVER,
+        authkey=os.getenv('MODEL_SERVER_AUTHKEY'),
+        backend=os.getenv('MODEL_BACKEND', 'keras').lower(),
+        tflite_quantization=os.getenv('TFLITE_QUANTIZATION', 'none').lower(),
+        policy_name=os.getenv('INFERENCE_POLICY', 'ensemble').lower(),
+        timeout=float(os.getenv('MODEL_SERVER_TIMEOUT', 30))
+    )
+else:
+    models = ModelRegistry.from_env()
+
+# Pooled, WAL-mode SQLite persistence
+db = Database(
+    path=os.getenv('DATABASE_PATH', 'waste_sorting.db'),
+    pool_size=int(os.getenv('DATABASE_POOL_SIZE', 8)),
+    busy_timeout_ms=int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', 5000)),
+    cache_size_kb=int(os.getenv('DATABASE_CACHE_KB', 16384)),
+    synchronous=os.getenv('DATABASE_SYNCHRONOUS', 'NORMAL')
+)
+
+# Optional write-behind: classifications and achievement unlocks are queued and
+# committed in batches off the request path; reads go through the same object
+# so statistics include rows that are still queued
+write_behind = None
+if os.getenv('WRITE_BEHIND', 'false').lower() == 'true':
+    write_behind = WriteBehindWriter(
+        db,
+        batch_size=int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 100)),
+        flush_interval_ms=float(os.getenv('WRITE_BEHIND_FLUSH_MS', 200)),
+        max_pending=int(os.getenv('WRITE_BEHIND_QUEUE', 10000)),
+        max_retries=int(os.getenv('WRITE_BEHIND_RETRIES', 5))
+    )
+classification_store = write_behind or db
+
+# Recyclability/eco-score rules, compiled once from a versioned JSON table;
+# the version is stored with every classification
+recyclability_rules = RecyclabilityRules.load(os.getenv('RECYCLABILITY_RULES', DEFAULT_RULES_PATH))
+
+bp = Blueprint('ecosort', __name__)
+
+
+@bp.route('/')
+def index():
+    return render_template('index.html')
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', 64))
+# Uncompressed size limits, checked against zip directories before anything is decompressed
+MAX_IMAGE_BYTES = int(float(os.getenv('MAX_IMAGE_MB', 32)) * 1024 * 1024)
+MAX_BATCH_BYTES = int(float(os.getenv('MAX_BATCH_MB', 256)) * 1024 * 1024)
+
+def allowed_image(filename):
+    """Check whether a filename has an image extension we can decode"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+# Persisting originals is optional and, by default, done by a background writer
+SAVE_UPLOADS = os.getenv('SAVE_UPLOADS', 'true').lower() == 'true'
+ASYNC_UPLOAD_WRITES = os.getenv('ASYNC_UPLOAD_WRITES', 'true').lower() == 'true'
+# Content-addressed originals plus thumbnails, with optional size/age retention
+upload_storage = UploadStorage.from_env(UPLOAD_FOLDER)
+upload_writer = UploadWriter(max_pending=int(os.getenv('UPLOAD_WRITER_QUEUE', 256)), write=upload_storage.ingest)
+
+def save_upload(data):
+    """
+    Store raw upload bytes under their content hash and return the path.
+    Identical uploads share one file; the thumbnail is generated alongside.
+    Returns None when uploads aren't persisted or the bytes aren't an image
+    format we accept (they would fail to decode anyway).
+    """
+    if not SAVE_UPLOADS:
+        return None
+    file_path = upload_storage.path_for(data)
+    if file_path is None:
+        return None
+    if ASYNC_UPLOAD_WRITES:
+        upload_writer.submit(file_path, data)
+    else:
+        upload_storage.ingest(file_path, data)
+    return file_path
+
+# Micro-batching scheduler: concurrent single-image requests share one forward pass
+ENABLE_MICRO_BATCHING = os.getenv('ENABLE_MICRO_BATCHING', 'true').lower() == 'true'
+inference_batcher = InferenceBatcher(
+    models.classify_batch,
+    max_batch_size=int(os.getenv('BATCH_MAX_SIZE', 8)),
+    max_wait_ms=float(os.getenv('BATCH_MAX_WAIT_MS', 10))
+)
+
+# Content-hash prediction cache: repeated frames skip quality analysis and inference
+prediction_cache = None
+if os.getenv('PREDICTION_CACHE', 'true').lower() == 'true':
+    prediction_cache = PredictionCache(
+        max_entries=int(os.getenv('PREDICTION_CACHE_SIZE', 1024)),
+        ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL', 3600)),
+        hash_mode=os.getenv('PREDICTION_CACHE_HASH', 'exact').lower(),
+        db_path=os.getenv('PREDICTION_CACHE_DB') or None,
+        namespace=f"{models.backend}-{models.tflite_quantization}-{models.policy_name}"
+    )
+
+def cache_lookup(digest):
+    """Return (cache_key, (prediction, quality_check) or None) for an image's content digest"""
+    if prediction_cache is None or digest is None:
+        return None, None
+    key = prediction_cache.key_for_digest(digest)
+    cached = prediction_cache.get(key)
+    if cached is None:
+        return key, None
+    return key, (tuple(cached['prediction']), cached['quality_check'])
+
+def cache_store(key, prediction, quality_check):
+    if prediction_cache is not None and key is not None:
+        prediction_cache.put(key, {'prediction': prediction, 'quality_check': quality_check})
+
+# Decode/resize stage: inline by default, or a thread/process pool (PREPROCESS_WORKERS > 0)
+preprocessor = PreprocessingStage(
+    workers=int(os.getenv('PREPROCESS_WORKERS', 0)),
+    executor=os.getenv('PREPROCESS_EXECUTOR', 'thread').lower(),
+    hash_mode=prediction_cache.hash_mode if prediction_cache is not None else None
+)
+# Batch uploads are decoded in chunks so the next chunk decodes while the current one is inferred
+PREPROCESS_CHUNK_SIZE = int(os.getenv('PREPROCESS_CHUNK_SIZE', 16))
+
+def score_recyclability(classified):
+    """Recyclability for a list of (prediction, quality_check) pairs, scored in one vectorized pass"""
+    with STAGE_SECONDS.time(stage='recyclability'):
+        return recyclability_rules.score_batch([prediction[0] for prediction, _ in classified],
+                                               [prediction[1] for prediction, _ in classified],
+                                               [quality_check['score'] for _, quality_check in classified])
+
+def build_result(file_path, prediction, quality_check, recyclability=None):
+    """
+    Persist one prediction and build the response fields.
+    recyclability comes from score_recyclability() on the batch paths and is scored here otherwise.
+    """
+    predicted_class, confidence, source_model, sorted_predictions = prediction
     
-    # Classifications table
-    c.execute('''CREATE TABLE IF NOT EXISTS classifications
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  image_path TEXT,
-                  predicted_class TEXT,
-                  confidence REAL,
-                  all_predictions TEXT,
-                  recyclable BOOLEAN,
-                  recyclable_confidence REAL,
-                  eco_score INTEGER,
-                  timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    # Determine recyclability
+    if recyclability is None:
+        with STAGE_SECONDS.time(stage='recyclability'):
+            recyclability = determine_recyclability(predicted_class, confidence, quality_check['score'])
+    is_recyclable, recyclable_confidence, recyclability_reason, eco_score = recyclability
     
-    # Achievements table
-    c.execute('''CREATE TABLE IF NOT EXISTS achievements
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  achievement_id TEXT UNIQUE,
-                  name TEXT,
-                  description TEXT,
-                  unlocked_at DATETIME)''')
+    # Save to database with recyclability
+    with STAGE_SECONDS.time(stage='db_write'):
+        classification_store.save_classification(file_path, predicted_class, confidence, str(sorted_predictions), 
+                                                 is_recyclable, recyclable_confidence, eco_score,
+                                                 recyclability_rules.version)
+    PREDICTIONS.inc(predicted_class=predicted_class, source_model=source_model)
     
-    conn.commit()
-    conn.close()
+    return {
+        'label': predicted_class,
+        'confidence': round(confidence, 2),
+        'all_predictions': sorted_predictions,
+        'recyclable': is_recyclable,
+        'recyclable_confidence': round(recyclable_confidence, 2),
+        'recyclability_reason': recyclability_reason,
+        'eco_score': eco_score,
+        'rules_version': recyclability_rules.version,
+        'image_path': file_path,
+        'thumbnail_path': upload_storage.preview_for(file_path),
+        'quality_check': quality_check
+    }
 
-init_db()
+class PredictError(Exception):
+    """A predict request that is answered with an error status instead of a result"""
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
 
-@app.route('/api/predict', methods=['POST'])
-def predict():
+def classify_upload():
+    """
+    /api/predict up to the database: validate the request, then store and classify the upload.
+    Returns the arguments for record_prediction(); raises PredictError.
+    """
     if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
+        raise PredictError('No file uploaded')
     
     file = request.files['file']
     if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+        raise PredictError('No file selected')
+    
+    if not models.wait_until_ready(MODEL_READY_TIMEOUT):
+        raise PredictError('Models are not ready yet - try again shortly', 503)
     
-    unique_filename = f"{uuid.uuid4().hex}_{file.filename}"
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    file.save(file_path)
+    # Decode once from memory; the same buffer feeds quality analysis and the models
+    data = file.read()
+    file_path = save_upload(data)
 
     try:
-        # Analyze image quality
-        quality_check = analyze_image_quality(file_path)
-        
-        # Load and preprocess image
-        image = load_img(file_path, target_size=(224, 224))  
-        image = img_to_array(image)
-        image = np.expand_dims(image, axis=0) / 255.0
-        
-        # DUAL-MODEL ENSEMBLE PREDICTION
-        if DUAL_MODEL_MODE:
-            # Run both models
-            predictions1 = model1.predict(image)[0]
-            predictions2 = model2.predict(image)[0]
+        with STAGE_SECONDS.time(stage='decode'):
+            batch = preprocessor.prepare([data])
+        with batch:
+            if batch.errors[0] is not None:
+                raise ValueError(f'Could not decode image: {batch.errors[0]}')
+            cache_key, cached = cache_lookup(batch.digests[0])
             
-            print(f"\n--- DEBUG PREDICTION ---")
-            print(f"Model 1 Raw: {predictions1}")
-            print(f"Model 2 Raw: {predictions2}")
-
-            # Get best prediction from each model
-            max_conf1 = np.max(predictions1)
-            max_idx1 = np.argmax(predictions1)
-            
-            max_conf2 = np.max(predictions2)
-            max_idx2 = np.argmax(predictions2)
-            
-            print(f"Model 1 Best: {model1_labels[max_idx1]} ({max_conf1*100:.2f}%)")
-            print(f"Model 2 Best: {model2_labels[max_idx2]} ({max_conf2*100:.2f}%)")
-
-            # Choose model with higher confidence
-            if max_conf1 > max_conf2:
-                predicted_class_idx = max_idx1
-                predicted_class = model1_labels[max_idx1]
-                confidence = float(max_conf1) * 100
-                source_model = "Model 1"
+            if cached is not None:
+                prediction, quality_check = cached
             else:
-                predicted_class_idx = len(model1_labels) + max_idx2  # Offset for model2
-                predicted_class = model2_labels[max_idx2]
-                confidence = float(max_conf2) * 100
-                source_model = "Model 2"
-            
-            print(f"Selected: {predicted_class} from {source_model}")
-            print(f"------------------------\n")
-
-            # Combine all predictions for display
-            all_predictions = {}
-            for i, label in enumerate(model1_labels):
-                all_predictions[label] = round(float(predictions1[i]) * 100, 2)
-            for i, label in enumerate(model2_labels):
-                all_predictions[label] = round(float(predictions2[i]) * 100, 2)
+                # Analyze image quality
+                quality_check = analyze_quality_buffers(batch.buffers[:1])[0]
                 
-        else:
-            # Single model mode (fallback)
-            predictions = model1.predict(image)
-            predicted_class_idx = np.argmax(predictions[0])
-            predicted_class = model1_labels[predicted_class_idx]
-            confidence = float(predictions[0][predicted_class_idx]) * 100
-            source_model = "Model 1 (Single)"
-            
-            all_predictions = {
-                model1_labels[i]: round(float(predictions[0][i]) * 100, 2)
-                for i in range(len(model1_labels))
-            }
-        
-        # Sort predictions by confidence
-        sorted_predictions = dict(sorted(all_predictions.items(), 
-                                        key=lambda x: x[1], 
-                                        reverse=True))
-        
-        # Determine recyclability
-        is_recyclable, recyclable_confidence, recyclability_reason, eco_score = determine_recyclability(
-            predicted_class, 
-            confidence, 
-            quality_check['score']
-        )
-        
-        # Save to database with recyclability
-        save_classification(file_path, predicted_class, confidence, str(sorted_predictions), 
-                          is_recyclable, recyclable_confidence, eco_score)
-        
-        # Check and unlock achievements
-        achievements = check_achievements()
-        
-        # Get statistics
-        stats = get_statistics()
-        
-        return jsonify({
-            'label': predicted_class,
-            'confidence': round(confidence, 2),
-            'all_predictions': sorted_predictions,
-            'recyclable': is_recyclable,
-            'recyclable_confidence': round(recyclable_confidence, 2),
-            'recyclability_reason': recyclability_reason,
-            'eco_score': eco_score,
-            'image_path': file_path,
-            'quality_check': quality_check,
-            'new_achievements': achievements,
-            'stats': stats
-        })
-        
+                with STAGE_SECONDS.time(stage='inference'):
+                    if ENABLE_MICRO_BATCHING:
+                        prediction = inference_batcher.predict(batch.inputs[0], quality_score=quality_check['score'])
+                    else:
+                        prediction = models.classify_batch(batch.inputs[:1], [quality_check['score']])[0]
+                cache_store(cache_key, prediction, quality_check)
+    except Exception as e:
+        raise PredictError(str(e), 500) from e
+    return file_path, prediction, quality_check
+
+def record_prediction(file_path, prediction, quality_check):
+    """/api/predict's database half: persist the prediction, unlock achievements and read the stats"""
+    result = build_result(file_path, prediction, quality_check)
+    
+    # Check and unlock achievements
+    with STAGE_SECONDS.time(stage='achievements'):
+        result['new_achievements'] = classification_store.check_achievements()
+    
+    # Get statistics
+    with STAGE_SECONDS.time(stage='stats'):
+        result['stats'] = classification_store.get_statistics()
+    return result
+
+@bp.route('/api/predict', methods=['POST'])
+def predict():
+    try:
+        return jsonify(record_prediction(*classify_upload()))
+    except PredictError as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def determine_recyclability(category, confidence, quality_score):
+class BatchUploadError(ValueError):
+    """A batch request that is malformed or over its limits (answered with 400)"""
+
+def collect_batch_uploads():
     """
-    Rule-based recyclable classifier
-    Returns: (is_recyclable, confidence, reason, eco_score)
+    Gather (filename, bytes) pairs from a batch request.
+    Accepts any number of multipart 'files' fields; zip archives are expanded.
+    File counts and sizes are checked against the archive directory before any
+    member is decompressed, so a small archive can't expand into a huge request.
     """
-    recyclability_rules = {
-        'metal': {
-            'recyclable': True,
-            'base_confidence': 95,
-            'reason': 'Metals are highly recyclable - aluminum and steel can be recycled indefinitely'
-        },
-        'glass': {
-            'recyclable': True,
-            'base_confidence': 90,
-            'reason': 'Glass is 100% recyclable and can be recycled endlessly without quality loss'
-        },
-        'plastic': {
-            'recyclable': True,
-            'base_confidence': 75,
-            'reason': 'Most plastics are recyclable if clean and dry (check recycling number)'
-        },
-        'paper': {
-            'recyclable': True,
-            'base_confidence': 85,
-            'reason': 'Paper is recyclable if clean and dry (not contaminated with food or grease)'
-        },
-        'trash': {
-            'recyclable': False,
-            'base_confidence': 95,
-            'reason': 'General waste - not recyclable through standard programs'
-        },
-        # NEW CATEGORIES
-        'food_waste': {
-            'recyclable': True,  # Via composting
-            'base_confidence': 90,
-            'reason': 'Food waste is compostable - turns into nutrient-rich soil for gardens'
-        },
-        'e_waste': {
-            'recyclable': True,
-            'base_confidence': 80,
-            'reason': 'E-waste recyclable at specialized facilities - contains valuable materials'
-        },
-        'textiles': {
-            'recyclable': True,
-            'base_confidence': 70,
-            'reason': 'Textiles can be donated or recycled into new fabrics and materials'
-        },
-        'hazardous': {
-            'recyclable': False,
-            'base_confidence': 95,
-            'reason': 'Hazardous waste requires special disposal - contact local hazardous waste facility'
-        },
-        'medical': {
-            'recyclable': False,
-            'base_confidence': 95,
-            'reason': 'Medical waste requires biohazard disposal - never throw in regular trash'
-        }
-    }
-    
-    rule = recyclability_rules.get(category.lower(), {
-        'recyclable': False,
-        'base_confidence': 50,
-        'reason': 'Unknown category - recyclability uncertain'
-    })
-    
-    is_recyclable = rule['recyclable']
-    recyclable_confidence = rule['base_confidence']
-    reason = rule['reason']
-    
-    # Adjust confidence based on image quality
-    if quality_score < 60:
-        recyclable_confidence = max(50, recyclable_confidence - 20)
-        reason += " (Note: Poor image quality may affect accuracy)"
-    
-    # Adjust confidence based on category confidence
-    if confidence < 70:
-        recyclable_confidence = max(50, recyclable_confidence - 15)
-    
-    # Calculate eco-score (0-100)
-    eco_score = 0
-    if is_recyclable:
-        eco_score = 70
-        if category.lower() in ['metal', 'glass']:
-            eco_score += 20
-        elif category.lower() == 'paper':
-            eco_score += 15
-        elif category.lower() == 'plastic':
-            eco_score += 10
-        if confidence > 85:
-            eco_score += 5
-        if quality_score > 80:
-            eco_score += 5
-    else:
-        eco_score = 30
-        if confidence > 85:
-            eco_score += 10
+    uploads = []
+    total_bytes = 0
+
+    def admit(filename, size):
+        nonlocal total_bytes
+        if len(uploads) + 1 > MAX_BATCH_FILES:
+            raise BatchUploadError(f'Too many files - maximum is {MAX_BATCH_FILES} per batch')
+        if size > MAX_IMAGE_BYTES:
+            raise BatchUploadError(f'{filename} is too large - maximum is {MAX_IMAGE_BYTES // (1024 * 1024)} MB per image')
+        total_bytes += size
+        if total_bytes > MAX_BATCH_BYTES:
+            raise BatchUploadError(f'Batch is too large - maximum is {MAX_BATCH_BYTES // (1024 * 1024)} MB uncompressed')
+
+    for file in request.files.getlist('files') + request.files.getlist('file'):
+        if file.filename == '':
+            continue
+        if file.filename.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(io.BytesIO(file.read())) as archive:
+                    members = [member for member in archive.infolist()
+                               if not member.is_dir() and allowed_image(member.filename)]
+                    if len(uploads) + len(members) > MAX_BATCH_FILES:
+                        raise BatchUploadError(f'Too many files - maximum is {MAX_BATCH_FILES} per batch')
+                    for member in members:
+                        admit(member.filename, member.file_size)
+                    # zipfile stops reading a member at its declared file_size, so the checks above bound memory
+                    for member in members:
+                        uploads.append((os.path.basename(member.filename), archive.read(member)))
+            except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, RuntimeError) as e:
+                # RuntimeError: encrypted members; NotImplementedError: unsupported compression
+                raise BatchUploadError(f'Could not read archive {file.filename}: {e}')
+        else:
+            data = file.read()
+            admit(file.filename, len(data))
+            uploads.append((file.filename, data))
+    return uploads
+
+def classify_uploads():
+    """
+    /api/predict/batch up to the database: collect, store and classify the uploads.
+    Returns the arguments for record_predictions(); raises PredictError.
+    """
+    try:
+        uploads = collect_batch_uploads()
+    except BatchUploadError as e:
+        raise PredictError(str(e)) from e
+    if not uploads:
+        raise PredictError('No files uploaded')
     
-    eco_score = min(100, max(0, eco_score))
+    if not models.wait_until_ready(MODEL_READY_TIMEOUT):
+        raise PredictError('Models are not ready yet - try again shortly', 503)
     
-    return is_recyclable, recyclable_confidence, reason, eco_score
-
-def analyze_image_quality(image_path):
-    """Analyze image quality and provide feedback"""
     try:
-        img = Image.open(image_path)
-        
-        # Convert to grayscale for analysis
-        gray = img.convert('L')
-        pixels = np.array(gray)
-        
-        # Calculate brightness
-        brightness = np.mean(pixels)
-        
-        # Calculate blur (variance of Laplacian)
-        laplacian = np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]])
-        blur_score = np.var(pixels)
+        file_paths = [save_upload(data) for _, data in uploads]
+        results = [None] * len(uploads)
+        classified = []
         
-        feedback = []
-        quality_score = 100
+        chunks = [list(range(start, min(start + PREPROCESS_CHUNK_SIZE, len(uploads))))
+                  for start in range(0, len(uploads), PREPROCESS_CHUNK_SIZE)]
+        pending = preprocessor.submit([uploads[i][1] for i in chunks[0]])
         
-        if brightness < 50:
-            feedback.append("⚠️ Image is too dark - try better lighting")
-            quality_score -= 30
-        elif brightness > 200:
-            feedback.append("⚠️ Image is too bright - reduce lighting")
-            quality_score -= 20
-        
-        if blur_score < 100:
-            feedback.append("⚠️ Image appears blurry - hold camera steady")
-            quality_score -= 25
-        
-        if not feedback:
-            feedback.append("✅ Image quality is good!")
-        
-        return {
-            'score': max(0, quality_score),
-            'feedback': feedback,
-            'brightness': round(brightness, 2),
-            'blur_score': round(blur_score, 2)
-        }
-    except:
-        return {'score': 100, 'feedback': ['✅ Image quality is good!'], 'brightness': 128, 'blur_score': 200}
-
-def save_classification(image_path, predicted_class, confidence, all_predictions, recyclable=None, recyclable_confidence=None, eco_score=None):
-    """Save classification to database"""
-    conn = sqlite3.connect('waste_sorting.db')
-    c = conn.cursor()
-    c.execute('''INSERT INTO classifications 
-                 (image_path, predicted_class, confidence, all_predictions, recyclable, recyclable_confidence, eco_score)
-                 VALUES (?, ?, ?, ?, ?, ?, ?)''',
-              (image_path, predicted_class, confidence, all_predictions, recyclable, recyclable_confidence, eco_score))
-    conn.commit()
-    conn.close()
-
-def check_achievements():
-    """Check and unlock new achievements"""
-    conn = sqlite3.connect('waste_sorting.db')
-    c = conn.cursor()
-    
-    # Get total classifications
-    c.execute('SELECT COUNT(*) FROM classifications')
-    total = c.fetchone()[0]
-    
-    new_achievements = []
-    
-    # Define achievements
-    achievements_list = [
-        ('first_scan', 'First Scan', 'Classified your first item!', 1),
-        ('eco_newbie', 'Eco Newbie', 'Classified 10 items', 10),
-        ('recycling_hero', 'Recycling Hero', 'Classified 50 items', 50),
-        ('planet_protector', 'Planet Protector', 'Classified 100 items', 100),
-        ('waste_wizard', 'Waste Wizard', 'Classified 500 items', 500),
-    ]
-    
-    for ach_id, name, desc, required in achievements_list:
-        if total >= required:
-            # Check if already unlocked
-            c.execute('SELECT id FROM achievements WHERE achievement_id = ?', (ach_id,))
-            if not c.fetchone():
-                # Unlock achievement
-                c.execute('''INSERT INTO achievements (achievement_id, name, description, unlocked_at)
-                            VALUES (?, ?, ?, ?)''',
-                         (ach_id, name, desc, datetime.now()))
-                new_achievements.append({'id': ach_id, 'name': name, 'description': desc})
-    
-    conn.commit()
-    conn.close()
-    
-    return new_achievements
+        try:
+            for n, chunk in enumerate(chunks):
+                with STAGE_SECONDS.time(stage='decode'):
+                    batch = pending.result()
+                with batch:
+                    if n + 1 < len(chunks):
+                        # Decode the next chunk while this one runs through the models
+                        pending = preprocessor.submit([uploads[i][1] for i in chunks[n + 1]])
+                    chunk_classified = []
+                    for row, prediction, quality_check in classify_prepared(batch):
+                        i = chunk[row]
+                        if prediction is None:
+                            results[i] = {'filename': uploads[i][0], 'error': f'Could not decode image: {quality_check}'}
+                        else:
+                            chunk_classified.append((i, prediction, quality_check))
+                
+                scores = score_recyclability([(prediction, quality_check) for _, prediction, quality_check in chunk_classified])
+                for (i, prediction, quality_check), recyclability in zip(chunk_classified, scores):
+                    classified.append((i, uploads[i][0], file_paths[i], prediction, quality_check, recyclability))
+        finally:
+            # Release a decoded chunk that was never classified (shared memory in process mode);
+            # closing an already classified one is a no-op
+            pending.result().close()
+    except Exception as e:
+        raise PredictError(str(e), 500) from e
+    return results, classified
 
-def get_statistics():
-    """Get user statistics"""
-    conn = sqlite3.connect('waste_sorting.db')
-    c = conn.cursor()
-    
-    # Total classifications
-    c.execute('SELECT COUNT(*) FROM classifications')
-    total = c.fetchone()[0]
-    
-    # By category
-    c.execute('''SELECT predicted_class, COUNT(*) 
-                 FROM classifications 
-                 GROUP BY predicted_class''')
-    by_category = dict(c.fetchall())
-    
-    # This week
-    c.execute('''SELECT COUNT(*) FROM classifications 
-                 WHERE timestamp >= datetime('now', '-7 days')''')
-    this_week = c.fetchone()[0]
-    
-    # Average confidence
-    c.execute('SELECT AVG(confidence) FROM classifications')
-    avg_confidence = c.fetchone()[0] or 0
-    
-    # Achievements unlocked
-    c.execute('SELECT COUNT(*) FROM achievements')
-    achievements_count = c.fetchone()[0]
-    
-    # Recyclability statistics
-    c.execute('SELECT COUNT(*) FROM classifications WHERE recyclable = 1')
-    recyclable_count = c.fetchone()[0] or 0
-    
-    c.execute('SELECT COUNT(*) FROM classifications WHERE recyclable = 0')
-    non_recyclable_count = c.fetchone()[0] or 0
-    
-    c.execute('SELECT AVG(eco_score) FROM classifications WHERE eco_score IS NOT NULL')
-    avg_eco_score = c.fetchone()[0] or 0
-    
-    conn.close()
+def record_predictions(results, classified):
+    """/api/predict/batch's database half: persist the predictions, unlock achievements and read the stats"""
+    for i, filename, file_path, prediction, quality_check, recyclability in classified:
+        result = build_result(file_path, prediction, quality_check, recyclability)
+        result['filename'] = filename
+        results[i] = result
+    
+    with STAGE_SECONDS.time(stage='achievements'):
+        new_achievements = classification_store.check_achievements()
+    with STAGE_SECONDS.time(stage='stats'):
+        stats = classification_store.get_statistics()
     
     return {
-        'total': total,
-        'by_category': by_category,
-        'this_week': this_week,
-        'avg_confidence': round(avg_confidence, 2),
-        'achievements_count': achievements_count,
-        'recyclable_count': recyclable_count,
-        'non_recyclable_count': non_recyclable_count,
-        'recyclability_rate': round((recyclable_count / total * 100) if total > 0 else 0, 1),
-        'avg_eco_score': round(avg_eco_score, 1)
+        'results': results,
+        'count': len(classified),
+        'new_achievements': new_achievements,
+        'stats': stats
     }
 
-@app.route('/api/history', methods=['GET'])
+@bp.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """Classify many images with one forward pass per model"""
+    try:
+        return jsonify(record_predictions(*classify_uploads()))
+    except PredictError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# The predict routes split at the database: asgi.py runs the first step on its
+# inference executor and the second on its db executor
+PREDICT_STEPS = {
+    '/api/predict': (classify_upload, record_prediction),
+    '/api/predict/batch': (classify_uploads, record_predictions),
+}
+
+def classify_prepared(batch):
+    """
+    Classify every decoded row of a PreparedBatch, using the cache where possible.
+    Yields (row, prediction, quality_check); undecodable rows yield (row, None, error).
+    """
+    misses = []
+    for row in range(len(batch.errors)):
+        if batch.errors[row] is not None:
+            yield row, None, batch.errors[row]
+            continue
+        cache_key, cached = cache_lookup(batch.digests[row])
+        if cached is not None:
+            yield (row,) + cached
+        else:
+            misses.append((row, cache_key))
+    
+    if misses:
+        # Stack cache misses into one (N, 224, 224, 3) tensor; quality goes first so the
+        # inference policy can give low-quality images extra attention
+        rows = [row for row, _ in misses]
+        quality_checks = analyze_quality_buffers(batch.buffers[rows])
+        with STAGE_SECONDS.time(stage='inference'):
+            predictions = models.classify_batch(batch.inputs[rows], [check['score'] for check in quality_checks])
+        
+        for (row, cache_key), prediction, quality_check in zip(misses, predictions, quality_checks):
+            cache_store(cache_key, prediction, quality_check)
+            yield row, prediction, quality_check
+
+def determine_recyclability(category, confidence, quality_score):
+    """
+    Rule-based recyclable classifier (rules from recyclability_rules.json)
+    Returns: (is_recyclable, confidence, reason, eco_score)
+    """
+    return recyclability_rules.score(category, confidence, quality_score)
+
+BLUR_THRESHOLD = float(os.getenv('BLUR_THRESHOLD', quality.BLUR_THRESHOLD))
+DEFAULT_QUALITY_CHECK = {'score': 100, 'feedback': ['✅ Image quality is good!'], 'brightness': 128, 'blur_score': 200}
+
+def analyze_image_quality(image):
+    """Analyze image quality and provide feedback (accepts a decoded PIL image or a path)"""
+    try:
+        img = image if isinstance(image, Image.Image) else decode_image(image)
+        return quality.analyze(quality.quality_buffer(img), BLUR_THRESHOLD)
+    except Exception:
+        return dict(DEFAULT_QUALITY_CHECK)
+
+def analyze_quality_buffers(buffers):
+    """Analyze a stack of quality buffers in one vectorized pass"""
+    try:
+        with STAGE_SECONDS.time(stage='quality'):
+            return quality.analyze_batch(buffers, BLUR_THRESHOLD)
+    except Exception:
+        return [dict(DEFAULT_QUALITY_CHECK) for _ in range(len(buffers))]
+
+HISTORY_MAX_LIMIT = int(os.getenv('HISTORY_MAX_LIMIT', 100))
+
+def parse_timestamp(value):
+    """Normalize an ISO date/datetime query parameter to SQLite's CURRENT_TIMESTAMP format (UTC)"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        # Stored timestamps are naive UTC, so an explicit offset is converted rather than dropped
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+@bp.route('/api/history', methods=['GET'])
 def get_history():
-    """Get classification history"""
-    conn = sqlite3.connect('waste_sorting.db')
-    c = conn.cursor()
-    
-    limit = request.args.get('limit', 20, type=int)
-    
-    c.execute('''SELECT id, image_path, predicted_class, confidence, timestamp
-                 FROM classifications
-                 ORDER BY timestamp DESC
-                 LIMIT ?''', (limit,))
-    
-    history = []
-    for row in c.fetchall():
-        history.append({
-            'id': row[0],
-            'image_path': row[1],
-            'predicted_class': row[2],
-            'confidence': row[3],
-            'timestamp': row[4]
-        })
-    
-    conn.close()
-    return jsonify(history)
+    """
+    Get classification history, newest first.
+    Query params: limit (capped at HISTORY_MAX_LIMIT), before_id / after_id
+    cursors, class, and since / until (ISO dates or datetimes, UTC unless
+    they carry an offset).
+    The cursor for the next (older) page is returned in X-Next-Before-Id.
+    """
+    limit = min(max(request.args.get('limit', 20, type=int), 1), HISTORY_MAX_LIMIT)
+    try:
+        since = parse_timestamp(request.args.get('since'))
+        until = parse_timestamp(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since/until must be ISO dates, e.g. 2024-05-01 or 2024-05-01T12:00:00'}), 400
+    
+    history = db.get_history(
+        limit,
+        before_id=request.args.get('before_id', type=int),
+        after_id=request.args.get('after_id', type=int),
+        predicted_class=request.args.get('class'),
+        since=since,
+        until=until
+    )
+    
+    # The history view shows thumbnails where they exist; originals stay available through image_path
+    for item in history:
+        item['thumbnail_path'] = upload_storage.preview_for(item['image_path'])
+    
+    response = jsonify(history)
+    if len(history) == limit:
+        response.headers['X-Next-Before-Id'] = str(history[-1]['id'])
+    return response
 
-@app.route('/api/achievements', methods=['GET'])
+@bp.route('/api/achievements', methods=['GET'])
 def get_achievements():
     """Get all achievements"""
-    conn = sqlite3.connect('waste_sorting.db')
-    c = conn.cursor()
-    
-    c.execute('''SELECT achievement_id, name, description, unlocked_at
-                 FROM achievements
-                 ORDER BY unlocked_at DESC''')
-    
-    achievements = []
-    for row in c.fetchall():
-        achievements.append({
-            'id': row[0],
-            'name': row[1],
-            'description': row[2],
-            'unlocked_at': row[3]
-        })
-    
-    conn.close()
-    return jsonify(achievements)
+    return jsonify(classification_store.get_achievements())
 
-@app.route('/api/stats', methods=['GET'])
+@bp.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get detailed statistics"""
-    return jsonify(get_statistics())
+    return jsonify(classification_store.get_statistics())
+
+@bp.route('/api/ready', methods=['GET'])
+def get_readiness():
+    """Readiness probe: 200 once every model is loaded and warmed, 503 before"""
+    readiness = models.readiness()
+    return jsonify(readiness), 200 if readiness['ready'] else 503
+
+@bp.route('/api/inference/stats', methods=['GET'])
+def get_inference_stats():
+    """Micro-batching queue depth, batch-size and inference policy metrics"""
+    stats = {
+        'micro_batching': ENABLE_MICRO_BATCHING,
+        **inference_batcher.stats()
+    }
+    if MODEL_SERVER:
+        # The policy runs in the model server; its stats are under model_server.policy
+        stats['model_server'] = models.server_stats()
+    else:
+        stats['policy'] = models.policy.stats()
+    return jsonify(stats)
+
+@bp.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Prediction cache hit rate and memory use"""
+    if prediction_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **prediction_cache.stats()})
+
+@bp.route('/api/uploads/stats', methods=['GET'])
+def get_upload_stats():
+    """Background upload writer queue, storage and retention counters"""
+    return jsonify({
+        'save_uploads': SAVE_UPLOADS,
+        'async_writes': ASYNC_UPLOAD_WRITES,
+        **upload_writer.stats(),
+        'storage': upload_storage.stats()
+    })
+
+@bp.route('/api/persistence/stats', methods=['GET'])
+def get_persistence_stats():
+    """Write-behind queue counters and database connection pool"""
+    return jsonify({
+        'write_behind': write_behind.stats() if write_behind is not None else {'enabled': False},
+        'database': db.pool_stats()
+    })
+
+@bp.route('/api/preprocessing/stats', methods=['GET'])
+def get_preprocessing_stats():
+    """Preprocessing stage configuration and counters"""
+    return jsonify(preprocessor.stats())
+
+# Per-request latency and counts by route, plus a few gauges read at scrape time
+REQUEST_SECONDS = REGISTRY.histogram(
+    'ecosort_request_seconds', 'HTTP request latency by route', labels=('method', 'route', 'status'))
+REGISTRY.gauge('ecosort_models_ready', 'Whether the models are loaded and warmed', lambda: int(models.ready))
+REGISTRY.gauge('ecosort_batch_queue_depth', 'Images waiting for the micro-batcher', lambda: inference_batcher.stats()['queue_depth'])
+REGISTRY.gauge('ecosort_upload_queue_pending', 'Uploads waiting for the background writer', lambda: upload_writer.stats()['pending'])
+REGISTRY.gauge('ecosort_write_behind_pending', 'Classifications queued for the write-behind writer',
+               lambda: write_behind.stats()['pending'] if write_behind is not None else None)
+REGISTRY.gauge('ecosort_prediction_cache_entries', 'Entries in the prediction cache',
+               lambda: prediction_cache.stats()['entries'] if prediction_cache is not None else None)
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+def observe_request(method, route, status, started):
+    """Record one request in REQUEST_SECONDS (also used by asgi.py for the routes it serves natively)"""
+    REQUEST_SECONDS.observe(time.perf_counter() - started, method=method, route=route, status=status)
 
-@app.route('/api/chat', methods=['POST'])
+@bp.after_app_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        observe_request(request.method, route, response.status_code, started)
+    return response
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint: stage/request latency histograms, prediction counters and gauges"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/chat', methods=['POST'])
 def chat():
     """AI Recycling Coach chatbot endpoint"""
     try:
@@ -508,58 +642,58 @@ def chat():
         history = data.get('history', [])
         
         # Check if Gemini is configured
-        if not GEMINI_API_KEY or GEMINI_API_KEY == 'your_gemini_api_key_here':
-            return jsonify({
-                'response': "I'm not fully configured yet! Please set your Gemini API key in the .env file to enable AI conversations. For now, try the quick action buttons! 🤖"
-            })
-        
-        # Build conversation prompt
-        system_prompt = """You are a friendly, encouraging AI Recycling Coach assistant named "Coach". 
-Your personality is like a supportive friend who's passionate about the environment.
-
-Key traits:
-- Friendly and encouraging (use emojis appropriately)
-- Educational but not preachy
-- Celebrates user actions
-- Keeps responses under 100 words
-- Uses simple language
-
-Current context:"""
-        
-        if context:
-            category = context.get('label', 'unknown').replace('_', ' ')
-            confidence = context.get('confidence', 0)
-            recyclable = context.get('recyclable', False)
-            
-            system_prompt += f"""
-The user just scanned: {category}
-Confidence: {confidence}%
-Recyclable: {'Yes' if recyclable else 'No'}
-"""
+        if not CHAT_ENABLED:
+            return jsonify({'response': CHAT_NOT_CONFIGURED_REPLY})
         
-        # Build conversation history
-        conversation_context = system_prompt + "\n\nConversation:\n"
-        for msg in history[-3:]:  # Last 3 messages for context
-            role = "User" if msg['role'] == 'user' else "Coach"
-            conversation_context += f"{role}: {msg['content']}\n"
-        
-        conversation_context += f"User: {user_message}\nCoach:"
-        
-        # Get Gemini response
-        response = gemini_model.generate_content(conversation_context)
-        bot_response = response.text
+        bot_response = chat_client.reply(build_prompt(user_message, context, history))
         
         return jsonify({'response': bot_response})
+    
+    except ChatBusyError:
+        return jsonify({'response': CHAT_BUSY_REPLY}), 429
+    
+    except TimeoutError as e:
+        logger.warning("Chat timeout: %s", e)
+        return jsonify({'response': CHAT_TIMEOUT_REPLY}), 504
         
-    except Exception as e:
-        print(f"Chat error: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Chat error")
         # Fallback response
-        return jsonify({
-            'response': "I'm having a bit of trouble right now, but I'm here to help! Try asking me about disposal methods, recycling tips, or your environmental impact! 🌍"
-        })
+        return jsonify({'response': CHAT_ERROR_REPLY})
 
 
+@bp.route('/api/chat/stats', methods=['GET'])
+def get_chat_stats():
+    """Chat backend concurrency, timeout and cache metrics"""
+    return jsonify(chat_client.stats())
+
+
+def create_app(model_loading=None):
+    """
+    Application factory.
+    Importing this module only builds objects; creating the upload folder, the
+    schema (and its migrations), the retention sweeper and the SIGTERM flush all
+    happen here, so tools that import the helpers touch nothing on disk.
+    Routes that don't need the models (/, /api/stats, /api/history, ...) are
+    servable as soon as this returns; model loading follows MODEL_LOADING.
+    """
+    app = Flask(__name__)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.register_blueprint(bp)
+    
+    db.init_schema()
+    upload_storage.start_sweeper(db)
+    if write_behind is not None:
+        write_behind.install_signal_handler()
+    
+    model_loading = model_loading or MODEL_LOADING
+    if model_loading == 'eager':
+        models.load()
+    elif model_loading == 'background':
+        models.start_background_load()
+    
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,238 @@
+import logging
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+from inference_policy import InferencePolicy, pick
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SHAPE = (224, 224, 3)
+MODEL1_PATH = 'my_model.h5'
+MODEL2_PATH = 'waste_model2.h5'
+MODEL1_LABELS = ['glass', 'metal', 'paper', 'plastic', 'trash']
+MODEL2_LABELS = ['food_waste', 'e_waste', 'textiles', 'hazardous', 'medical']
+
+# Share of predictions whose raw model outputs are logged at DEBUG level (0 = none, 1 = all)
+PREDICTION_LOG_SAMPLE_RATE = float(os.getenv('PREDICTION_LOG_SAMPLE_RATE', 1.0))
+
+
+class ModelRegistry:
+    """
+    Owns the classification models and loads them on demand.
+    TensorFlow is only imported when load() runs, so the web app can start
+    serving non-ML routes immediately and warm the models in the background.
+    """
+
+    def __init__(self, backend='keras', tflite_quantization='none', tflite_model_dir='.', fused=False, policy=None):
+        self.backend = backend
+        self.tflite_quantization = tflite_quantization
+        self.tflite_model_dir = tflite_model_dir
+        self.fused = fused
+        self.policy = policy or InferencePolicy()
+
+        self.model1 = None
+        self.model2 = None
+        self.fused_model = None
+        self.model1_labels = list(MODEL1_LABELS)
+        self.model2_labels = []
+        self.dual_model_mode = False
+        self.status = {'model1': {'state': 'pending'}, 'model2': {'state': 'pending'}}
+        self.error = None
+
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls):
+        """Registry configured from MODEL_BACKEND, TFLITE_QUANTIZATION, TFLITE_MODEL_DIR, FUSED_ENSEMBLE and INFERENCE_POLICY"""
+        return cls(
+            # Inference backend: 'keras' (.h5) or 'tflite' (converted with convert_models.py)
+            backend=os.getenv('MODEL_BACKEND', 'keras').lower(),
+            tflite_quantization=os.getenv('TFLITE_QUANTIZATION', 'none').lower(),
+            tflite_model_dir=os.getenv('TFLITE_MODEL_DIR', '.'),
+            # Optional fused ensemble: both models, concatenation and selection in one graph call
+            fused=os.getenv('FUSED_ENSEMBLE', 'false').lower() == 'true',
+            # ensemble | cascade | tta | cascade_tta (see inference_policy.py)
+            policy=InferencePolicy.from_env()
+        )
+
+    @property
+    def class_labels(self):
+        """Combined class labels (10 total in dual-model mode)"""
+        return self.model1_labels + self.model2_labels
+
+    @property
+    def policy_name(self):
+        return self.policy.name
+
+    @property
+    def ready(self):
+        return self._loaded.is_set() and self.model1 is not None
+
+    def _load_classifier(self, model_path):
+        """Load a model with the configured backend"""
+        if self.backend == 'tflite':
+            from tflite_model import TFLiteModel, tflite_path
+            return TFLiteModel(tflite_path(model_path, self.tflite_quantization, self.tflite_model_dir))
+        from tensorflow.keras.models import load_model
+        return load_model(model_path)
+
+    def _warm_up(self, name, predict):
+        """Run a dummy inference so the first real request doesn't pay for graph setup"""
+        start = time.perf_counter()
+        predict(np.zeros((1,) + IMAGE_SHAPE, dtype=np.float32))
+        self.status[name]['warmup_seconds'] = round(time.perf_counter() - start, 3)
+
+    def load(self):
+        """Load and warm every model; safe to call more than once"""
+        with self._lock:
+            if self._loaded.is_set():
+                return
+            try:
+                print(f"Loading Model 1 (Original 5 categories) with {self.backend} backend...")
+                self.status['model1'] = {'state': 'loading'}
+                start = time.perf_counter()
+                self.model1 = self._load_classifier(MODEL1_PATH)
+                self.status['model1'] = {'state': 'loaded', 'load_seconds': round(time.perf_counter() - start, 3)}
+                self._warm_up('model1', self.model1.predict_on_batch)
+                self.status['model1']['state'] = 'ready'
+
+                # Try to load Model 2 (New 5 categories)
+                try:
+                    print("Loading Model 2 (Additional 5 categories)...")
+                    self.status['model2'] = {'state': 'loading'}
+                    start = time.perf_counter()
+                    self.model2 = self._load_classifier(MODEL2_PATH)
+                    self.status['model2'] = {'state': 'loaded', 'load_seconds': round(time.perf_counter() - start, 3)}
+                    self._warm_up('model2', self.model2.predict_on_batch)
+                    self.status['model2']['state'] = 'ready'
+                    self.model2_labels = list(MODEL2_LABELS)
+                    self.dual_model_mode = True
+                    print("✅ Dual-model mode activated!")
+                except Exception:
+                    print("⚠️  Model 2 not found - using single model mode")
+                    self.model2 = None
+                    self.status['model2'] = {'state': 'unavailable'}
+
+                print(f"📋 Total categories: {len(self.class_labels)}")
+
+                # Optional fused ensemble: both models, concatenation and selection in one graph call
+                if self.fused and self.backend == 'tflite':
+                    print("⚠️  FUSED_ENSEMBLE is only supported with the keras backend - ignoring")
+                elif self.fused and self.policy.name != 'ensemble':
+                    print(f"⚠️  FUSED_ENSEMBLE only implements the ensemble policy - running {self.policy.name} unfused")
+                elif self.fused:
+                    from ensemble import build_fused_model
+                    print("Building fused ensemble graph...")
+                    self.fused_model = build_fused_model(self.model1, self.model2)
+                    print("✅ Fused ensemble ready!")
+            except Exception as e:
+                print(f"❌ Model loading failed: {e}")
+                self.error = str(e)
+                self.status['model1'] = {'state': 'failed', 'error': str(e)}
+            finally:
+                self._loaded.set()
+
+    def start_background_load(self):
+        """Load and warm the models on a background thread"""
+        if self._thread is None and not self._loaded.is_set():
+            self._thread = threading.Thread(target=self.load, name='model-warmup', daemon=True)
+            self._thread.start()
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the models are loaded; loads them in the calling thread if nothing else is"""
+        if self._thread is None:
+            self.load()
+        else:
+            self._loaded.wait(timeout)
+        return self.ready
+
+    def readiness(self):
+        return {
+            'ready': self.ready,
+            'backend': self.backend,
+            'dual_model_mode': self.dual_model_mode,
+            'fused_ensemble': self.fused_model is not None,
+            'policy': self.policy.name,
+            'models': self.status,
+            'error': self.error
+        }
+
+    def classify_batch(self, images, quality_scores=None):
+        """
+        Run the inference policy on a stacked (N, 224, 224, 3) batch.
+        Each model is called at most once per step for the whole batch.
+        quality_scores (one per image, or None) let the TTA policy revisit low-quality images.
+        Returns one (predicted_class, confidence, source_model, sorted_predictions) tuple per image.
+        """
+        model1_labels = self.model1_labels
+        model2_labels = self.model2_labels
+        class_labels = self.class_labels
+        results = []
+
+        # FUSED ENSEMBLE: one graph call does inference, argmax and model selection
+        if self.fused_model is not None:
+            with STAGE_SECONDS.time(stage='fused_ensemble'):
+                outputs = self.fused_model(np.asarray(images, dtype=np.float32))
+            probabilities = outputs['probabilities'].numpy()
+            indices = outputs['index'].numpy()
+            confidences = outputs['confidence'].numpy()
+
+            for predictions, idx, conf in zip(probabilities, indices, confidences):
+                if not self.dual_model_mode:
+                    source_model = "Model 1 (Single)"
+                elif idx < len(model1_labels):
+                    source_model = "Model 1"
+                else:
+                    source_model = "Model 2"
+
+                all_predictions = {
+                    label: round(float(predictions[i]) * 100, 2)
+                    for i, label in enumerate(class_labels)
+                }
+                results.append((class_labels[idx], float(conf) * 100, source_model, all_predictions))
+
+        # POLICY-DRIVEN PREDICTION: the policy decides which models (and augmentations) each image gets
+        else:
+            batch_predictions = self.policy.run(self.model1, self.model2, np.asarray(images), quality_scores)
+            select_start = time.perf_counter()
+
+            for predictions1, predictions2 in batch_predictions:
+                # Model with the higher best confidence wins
+                model, index, confidence = pick(predictions1, predictions2)
+                if not self.dual_model_mode:
+                    source_model = "Model 1 (Single)"
+                elif model == 1:
+                    source_model = "Model 1"
+                else:
+                    source_model = "Model 2"
+                predicted_class = (model1_labels if model == 1 else model2_labels)[index]
+                confidence *= 100
+
+                if logger.isEnabledFor(logging.DEBUG) and random.random() < PREDICTION_LOG_SAMPLE_RATE:
+                    logger.debug("Model 1 raw %s | Model 2 raw %s | selected %s (%.2f%%) from %s",
+                                 predictions1, predictions2, predicted_class, confidence, source_model)
+
+                # Combine all predictions for display (model 2's are absent when a cascade skipped it)
+                all_predictions = {}
+                for i, label in enumerate(model1_labels):
+                    all_predictions[label] = round(float(predictions1[i]) * 100, 2)
+                if predictions2 is not None:
+                    for i, label in enumerate(model2_labels):
+                        all_predictions[label] = round(float(predictions2[i]) * 100, 2)
+
+                results.append((predicted_class, confidence, source_model, all_predictions))
+            STAGE_SECONDS.observe(time.perf_counter() - select_start, stage='ensemble_select')
+
+        # Sort predictions by confidence
+        return [
+            (predicted_class, confidence, source_model,
+             dict(sorted(all_predictions.items(), key=lambda x: x[1], reverse=True)))
+            for predicted_class, confidence, source_model, all_predictions in results
+        ]
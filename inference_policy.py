@@ -0,0 +1,228 @@
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+from metrics import REGISTRY, STAGE_SECONDS
+
+POLICIES = ['ensemble', 'cascade', 'tta', 'cascade_tta']
+
+POLICY_DECISIONS = REGISTRY.counter(
+    'ecosort_policy_decisions', 'Inference policy decisions per image', labels=('decision',))
+
+
+def _center_crop(images, fraction=0.875):
+    """Zoom into the center and sample back up to the input size (nearest neighbour)"""
+    size = images.shape[1]
+    crop = int(size * fraction)
+    offset = (size - crop) // 2
+    index = np.round(np.linspace(offset, offset + crop - 1, size)).astype(np.intp)
+    return images[:, index][:, :, index]
+
+
+# Test-time augmentations; the un-augmented image is always part of the average
+TTA_VIEWS = {
+    'flip': lambda images: images[:, :, ::-1],
+    'crop': _center_crop,
+    'crop_flip': lambda images: _center_crop(images)[:, :, ::-1],
+}
+
+
+def pick(predictions1, predictions2=None):
+    """
+    The ensemble's choice for one image: (model, index, confidence) where model
+    is 1 or 2. Model 1 wins unless model 2's best softmax value is at least as high.
+    """
+    index1 = int(np.argmax(predictions1))
+    if predictions2 is None or predictions1[index1] > np.max(predictions2):
+        return 1, index1, float(predictions1[index1])
+    index2 = int(np.argmax(predictions2))
+    return 2, index2, float(predictions2[index2])
+
+
+class InferencePolicy:
+    """
+    Decides how much model compute each image gets.
+
+    ensemble     both models on every image, higher max-softmax wins (the original behaviour)
+    cascade      model 1 first; model 2 only for images where model 1 is below cascade_threshold
+    tta          ensemble, then images below tta_confidence_threshold (or with a quality
+                 score below tta_quality_threshold) are re-run on flipped/cropped views in
+                 one extra forward pass per model, and the softmax outputs are averaged
+    cascade_tta  cascade followed by the TTA step
+
+    A shadow_rate share of cascade batches also runs model 2 on the images it
+    skipped, to measure how often the early exit agrees with the full ensemble.
+    """
+
+    def __init__(self, name='ensemble', cascade_threshold=0.9, tta_confidence_threshold=0.6,
+                 tta_quality_threshold=60, tta_views=('flip', 'crop'), shadow_rate=0.05):
+        if name not in POLICIES:
+            raise ValueError(f'Unknown INFERENCE_POLICY: {name} (choose from {", ".join(POLICIES)})')
+        unknown = [view for view in tta_views if view not in TTA_VIEWS]
+        if unknown:
+            raise ValueError(f'Unknown TTA views: {", ".join(unknown)} (choose from {", ".join(TTA_VIEWS)})')
+        self.name = name
+        self.cascade = name in ('cascade', 'cascade_tta')
+        self.tta = name in ('tta', 'cascade_tta')
+        self.cascade_threshold = float(cascade_threshold)
+        self.tta_confidence_threshold = float(tta_confidence_threshold)
+        self.tta_quality_threshold = float(tta_quality_threshold)
+        self.tta_views = list(tta_views)
+        self.shadow_rate = float(shadow_rate)
+
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.images = 0
+        self.total_ms = 0.0
+        self.early_exits = 0
+        self.escalated = 0
+        self.shadow_checked = 0
+        self.shadow_agreed = 0
+        self.tta_images = 0
+        self.tta_low_quality = 0
+        self.tta_changed = 0
+        self.tta_ms = 0.0
+
+    @classmethod
+    def from_env(cls):
+        """Policy configured from INFERENCE_POLICY, CASCADE_THRESHOLD, TTA_* and POLICY_SHADOW_RATE"""
+        return cls(
+            name=os.getenv('INFERENCE_POLICY', 'ensemble').lower(),
+            cascade_threshold=float(os.getenv('CASCADE_THRESHOLD', 0.9)),
+            tta_confidence_threshold=float(os.getenv('TTA_CONFIDENCE_THRESHOLD', 0.6)),
+            tta_quality_threshold=float(os.getenv('TTA_QUALITY_THRESHOLD', 60)),
+            tta_views=[view.strip() for view in os.getenv('TTA_VIEWS', 'flip,crop').split(',') if view.strip()],
+            shadow_rate=float(os.getenv('POLICY_SHADOW_RATE', 0.05))
+        )
+
+    def run(self, model1, model2, images, quality_scores=None):
+        """
+        Softmax outputs for a (N, 224, 224, 3) batch: a list of (predictions1,
+        predictions2) per image, where predictions2 is None if model 2 was
+        skipped (or there is no model 2).
+        """
+        start = time.perf_counter()
+        count = len(images)
+        with STAGE_SECONDS.time(stage='model1'):
+            predictions1 = np.array(model1.predict_on_batch(images), dtype=np.float32)
+        predictions2 = [None] * count
+
+        if model2 is not None:
+            if self.cascade:
+                escalate = np.flatnonzero(predictions1.max(axis=1) < self.cascade_threshold)
+            else:
+                escalate = np.arange(count)
+            if len(escalate):
+                with STAGE_SECONDS.time(stage='model2'):
+                    outputs = np.array(model2.predict_on_batch(images[escalate]), dtype=np.float32)
+                for row, output in zip(escalate, outputs):
+                    predictions2[row] = output
+            if self.cascade:
+                skipped = np.setdiff1d(np.arange(count), escalate)
+                self._record_cascade(len(skipped), len(escalate))
+                if len(skipped) and random.random() < self.shadow_rate:
+                    self._shadow(model2, images, predictions1, skipped)
+
+        if self.tta:
+            self._tta(model1, model2, images, predictions1, predictions2, quality_scores)
+
+        with self._lock:
+            self.batches += 1
+            self.images += count
+            self.total_ms += (time.perf_counter() - start) * 1000
+        return list(zip(predictions1, predictions2))
+
+    def _record_cascade(self, early_exits, escalated):
+        POLICY_DECISIONS.inc(early_exits, decision='early_exit')
+        POLICY_DECISIONS.inc(escalated, decision='escalated')
+        with self._lock:
+            self.early_exits += early_exits
+            self.escalated += escalated
+
+    def _shadow(self, model2, images, predictions1, rows):
+        """Run the skipped model on early-exit rows and count how often the answer would have been the same"""
+        with STAGE_SECONDS.time(stage='policy_shadow'):
+            shadow = np.asarray(model2.predict_on_batch(images[rows]))
+        agreed = int(np.sum(predictions1[rows].max(axis=1) > np.max(shadow, axis=1)))
+        with self._lock:
+            self.shadow_checked += len(rows)
+            self.shadow_agreed += agreed
+
+    def _tta(self, model1, model2, images, predictions1, predictions2, quality_scores):
+        """Average augmented views into the predictions of uncertain or low-quality images, in place"""
+        confidences = np.array([pick(p1, p2)[2] for p1, p2 in zip(predictions1, predictions2)])
+        low_quality = np.array([score is not None and score < self.tta_quality_threshold
+                                for score in (quality_scores if quality_scores is not None else [None] * len(images))])
+        targets = np.flatnonzero((confidences < self.tta_confidence_threshold) | low_quality)
+        if not len(targets) or not self.tta_views:
+            return
+
+        start = time.perf_counter()
+        before = [pick(predictions1[row], predictions2[row])[:2] for row in targets]
+        target_images = images[targets]
+        num_views = len(self.tta_views)
+        # (T, V, 224, 224, 3) -> one (T * V, ...) batch per model
+        views = np.stack([TTA_VIEWS[name](target_images) for name in self.tta_views], axis=1)
+        views = views.reshape((-1,) + images.shape[1:])
+
+        outputs1 = np.asarray(model1.predict_on_batch(views)).reshape(len(targets), num_views, -1)
+        predictions1[targets] = (predictions1[targets] + outputs1.sum(axis=1)) / (num_views + 1)
+
+        # Model 2 is only re-run where it ran in the first place (a cascade may have skipped it)
+        with_model2 = [i for i, row in enumerate(targets) if predictions2[row] is not None]
+        if model2 is not None and with_model2:
+            views2 = views.reshape((len(targets), num_views) + images.shape[1:])[with_model2]
+            outputs2 = np.asarray(model2.predict_on_batch(views2.reshape((-1,) + images.shape[1:])))
+            outputs2 = outputs2.reshape(len(with_model2), num_views, -1)
+            for i, output in zip(with_model2, outputs2):
+                row = targets[i]
+                predictions2[row] = (predictions2[row] + output.sum(axis=0)) / (num_views + 1)
+
+        changed = sum(1 for row, previous in zip(targets, before)
+                      if pick(predictions1[row], predictions2[row])[:2] != previous)
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage='tta')
+        POLICY_DECISIONS.inc(len(targets), decision='tta')
+        POLICY_DECISIONS.inc(changed, decision='tta_changed')
+        with self._lock:
+            self.tta_images += len(targets)
+            self.tta_low_quality += int(low_quality[targets].sum())
+            self.tta_changed += changed
+            self.tta_ms += elapsed * 1000
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'policy': self.name,
+                'batches': self.batches,
+                'images': self.images,
+                'avg_ms_per_image': round(self.total_ms / self.images, 3) if self.images else 0,
+            }
+            if self.cascade:
+                routed = self.early_exits + self.escalated
+                stats['cascade'] = {
+                    'threshold': self.cascade_threshold,
+                    'early_exits': self.early_exits,
+                    'escalated': self.escalated,
+                    'early_exit_rate': round(self.early_exits / routed * 100, 2) if routed else 0,
+                    'shadow_rate': self.shadow_rate,
+                    'shadow_checked': self.shadow_checked,
+                    # How often skipping model 2 gave the same answer as the full ensemble
+                    'shadow_agreement_rate': round(self.shadow_agreed / self.shadow_checked * 100, 2) if self.shadow_checked else None
+                }
+            if self.tta:
+                stats['tta'] = {
+                    'views': self.tta_views,
+                    'confidence_threshold': self.tta_confidence_threshold,
+                    'quality_threshold': self.tta_quality_threshold,
+                    'images': self.tta_images,
+                    'low_quality_images': self.tta_low_quality,
+                    'changed': self.tta_changed,
+                    # How often averaging the augmented views changed the answer
+                    'change_rate': round(self.tta_changed / self.tta_images * 100, 2) if self.tta_images else None,
+                    'avg_ms_per_image': round(self.tta_ms / self.tta_images, 3) if self.tta_images else 0
+                }
+            return stats
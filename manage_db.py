@@ -0,0 +1,88 @@
+"""
+Database maintenance commands.
+
+Usage:
+    python manage_db.py rebuild-stats     # backfill/rebuild the statistics rollups
+    python manage_db.py verify-stats      # check the rollups against a full table scan
+    python manage_db.py sweep-uploads     # apply upload retention now (UPLOAD_MAX_MB / UPLOAD_MAX_AGE_DAYS)
+"""
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from database import Database
+from upload_storage import UploadStorage
+
+# Same folder the web app stores uploads in
+UPLOAD_FOLDER = 'static/uploads'
+
+
+def rebuild_stats(db):
+    start = time.perf_counter()
+    db.rebuild_statistics()
+    stats = db.get_statistics()
+    print(f"✅ Rebuilt statistics rollups for {stats['total']} classifications "
+          f"in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def verify_stats(db):
+    """Compare the rollup statistics with the full-scan aggregates; exit code 1 on mismatch"""
+    start = time.perf_counter()
+    rollup = db.get_statistics()
+    rollup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    full_scan = db.get_statistics_full_scan()
+    full_scan_seconds = time.perf_counter() - start
+
+    mismatches = [key for key in full_scan if rollup.get(key) != full_scan[key]]
+    for key in mismatches:
+        print(f"❌ {key}: rollup={rollup.get(key)!r} full_scan={full_scan[key]!r}")
+
+    print(f"Rollup read: {rollup_seconds * 1000:.2f} ms, full scan: {full_scan_seconds * 1000:.2f} ms")
+    if mismatches:
+        print("Rollups are out of date - run `python manage_db.py rebuild-stats`")
+        return 1
+    print(f"✅ Rollups match the full scan ({full_scan['total']} classifications)")
+    return 0
+
+
+def sweep_uploads(db):
+    """One retention pass over the upload folder, e.g. from cron when the in-app sweeper is disabled"""
+    storage = UploadStorage.from_env(UPLOAD_FOLDER)
+    if not (storage.max_bytes or storage.max_age):
+        print("Nothing to do - set UPLOAD_MAX_MB and/or UPLOAD_MAX_AGE_DAYS")
+        return 0
+    start = time.perf_counter()
+    summary = storage.sweep(db)
+    print(f"✅ Removed {summary['removed_files']} files ({summary['freed_bytes'] / 1024 / 1024:.1f} MB) "
+          f"and cleared {summary['cleared_references']} references in {time.perf_counter() - start:.2f}s; "
+          f"{summary['remaining_files']} files ({summary['remaining_bytes'] / 1024 / 1024:.1f} MB) remain")
+    return 0
+
+
+COMMANDS = {
+    'rebuild-stats': rebuild_stats,
+    'verify-stats': verify_stats,
+    'sweep-uploads': sweep_uploads,
+}
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='EcoSort database maintenance')
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--db', default=os.getenv('DATABASE_PATH', 'waste_sorting.db'), help='SQLite database path')
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    db.init_schema()
+    sys.exit(COMMANDS[args.command](db))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Histograms and counters are labeled and thread-safe; MetricsRegistry.render()
+produces the text format served at /metrics. Each process keeps its own
+values, so with several web workers every scrape reflects one worker.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans sub-millisecond DB calls up to slow CPU inference
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """Monotonic counter, one series per label combination"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}_total{_format_labels(self.labels, key)} {_format_value(value)}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block, including when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: dict(value, counts=list(value['counts'])) for key, value in self._series.items()}
+        for key, value in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, value['counts']):
+                cumulative += count
+                yield f'{self.name}_bucket{_format_labels(self.labels, key, [("le", _format_value(bound))])} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(value["sum"])}'
+            yield f'{self.name}_count{_format_labels(self.labels, key)} {value["count"]}'
+
+    def summary(self):
+        """{label values: {'count', 'mean_ms'}} for JSON stats endpoints"""
+        with self._lock:
+            return {
+                ','.join(key) or self.name: {
+                    'count': value['count'],
+                    'mean_ms': round(value['sum'] / value['count'] * 1000, 3) if value['count'] else 0
+                }
+                for key, value in sorted(self._series.items())
+            }
+
+
+class Gauge:
+    """Point-in-time value read from a callback at scrape time"""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def samples(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return
+        if value is not None:
+            yield f'{self.name} {_format_value(value)}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Duplicate metric: {metric.name}')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, callback):
+        return self._register(Gauge(name, documentation, callback))
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            exposed_name = f'{metric.name}_total' if metric.type == 'counter' else metric.name
+            lines.append(f'# HELP {exposed_name} {metric.documentation}')
+            lines.append(f'# TYPE {exposed_name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry and the metrics shared across modules
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram(
+    'ecosort_stage_seconds', 'Time spent in each stage of the prediction path', labels=('stage',))
+PREDICTIONS = REGISTRY.counter(
+    'ecosort_predictions', 'Classifications by predicted class and source model', labels=('predicted_class', 'source_model'))
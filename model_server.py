@@ -0,0 +1,320 @@
+"""
+Dedicated inference server: one process owns the models for every web worker.
+
+Usage:
+    python model_server.py                          # listens on MODEL_SERVER (default model_server.sock)
+    python model_server.py --address 127.0.0.1:6000 # TCP instead of a Unix socket
+    python model_server.py --address 10.0.0.5:6000 --allow-remote   # listen beyond loopback
+
+MODEL_SERVER_AUTHKEY must be set to a shared secret (serve.py generates one
+per launch). Messages are pickled, so anyone holding the key can run code in
+this process: keep it secret and the server on a Unix socket or loopback.
+
+Web workers started with MODEL_SERVER=<address> send preprocessed batches here
+instead of loading their own copy of the models, so adding HTTP workers adds
+no model memory. Requests from all workers share one micro-batching queue.
+"""
+import argparse
+import ipaddress
+import logging
+import os
+import queue
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+import numpy as np
+from dotenv import load_dotenv
+
+from batching import InferenceBatcher
+from inference import ModelRegistry
+
+DEFAULT_ADDRESS = 'model_server.sock'
+
+
+def parse_address(address):
+    """'host:port' means TCP; anything else is a Unix socket path"""
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return (host, int(port)), 'AF_INET'
+    return address, 'AF_UNIX'
+
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def require_authkey(authkey):
+    """The shared secret as bytes; there is deliberately no default"""
+    if not authkey:
+        raise ValueError('MODEL_SERVER_AUTHKEY must be set to a shared secret for the model server')
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+def limit_send_time(conn, timeout):
+    """Make writes to conn fail after timeout seconds instead of blocking on a peer that stopped reading"""
+    sock = socket.socket(fileno=conn.fileno())
+    try:
+        seconds = int(timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO,
+                        struct.pack('ll', seconds, int((timeout - seconds) * 1_000_000)))
+    finally:
+        # The connection keeps owning the file descriptor
+        sock.detach()
+
+
+class ModelServer:
+    """
+    Serves classify/readiness/stats requests over multiprocessing.connection.
+    Each client connection gets a thread; image tensors travel as raw float32
+    bytes, results come back pickled. Single images go through a shared
+    InferenceBatcher so concurrent requests from different workers are
+    batched together; multi-image batches run directly.
+    """
+
+    def __init__(self, registry, address=DEFAULT_ADDRESS, authkey=None, max_batch_size=8, max_wait_ms=10,
+                 allow_remote=False):
+        self.registry = registry
+        self.address, self.family = parse_address(address)
+        if self.family == 'AF_INET' and not allow_remote and not is_loopback(self.address[0]):
+            raise ValueError(f'Refusing to listen on non-loopback address {address} (pass --allow-remote to override)')
+        self.authkey = require_authkey(authkey)
+        self.batcher = InferenceBatcher(registry.classify_batch, max_batch_size, max_wait_ms)
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.images = 0
+        self.errors = 0
+        self.started_at = time.time()
+
+    def _classify(self, images, quality_scores=None):
+        if not self.registry.wait_until_ready():
+            raise RuntimeError(f'Models failed to load: {self.registry.error}')
+        if len(images) == 1:
+            return [self.batcher.predict(images[0], quality_score=quality_scores[0] if quality_scores else None)]
+        return self.registry.classify_batch(images, quality_scores)
+
+    def _handle(self, conn):
+        with self._lock:
+            self.connections += 1
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    command, arg = message
+                    if command == 'classify':
+                        shape, quality_scores = arg
+                        images = np.frombuffer(conn.recv_bytes(), dtype=np.float32).reshape(shape)
+                        reply = self._classify(images, quality_scores)
+                        with self._lock:
+                            self.images += len(images)
+                    elif command == 'readiness':
+                        reply = self.registry.readiness()
+                    elif command == 'stats':
+                        reply = self.stats()
+                    else:
+                        raise ValueError(f'Unknown command: {command}')
+                    with self._lock:
+                        self.requests += 1
+                    conn.send(('ok', reply))
+                except (EOFError, OSError):
+                    return
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    conn.send(('error', str(e)))
+        finally:
+            conn.close()
+            with self._lock:
+                self.connections -= 1
+
+    def serve_forever(self):
+        if self.family == 'AF_UNIX' and os.path.exists(self.address):
+            os.unlink(self.address)
+        with Listener(self.address, family=self.family, backlog=128, authkey=self.authkey) as listener:
+            if self.family == 'AF_UNIX':
+                os.chmod(self.address, 0o600)
+            print(f"🧠 Model server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError) as e:
+                    print(f"⚠️  Rejected model server connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), name='model-server-conn', daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'pid': os.getpid(),
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'connections': self.connections,
+                'requests': self.requests,
+                'images': self.images,
+                'errors': self.errors
+            }
+        stats['batching'] = self.batcher.stats()
+        stats['policy'] = self.registry.policy.stats()
+        return stats
+
+
+class RemoteModelRegistry:
+    """
+    Drop-in stand-in for ModelRegistry that forwards inference to a ModelServer.
+    Connections are pooled per process and re-established if the server restarts.
+    A reply that takes longer than timeout seconds, or a rejected authkey,
+    raises ConnectionError like an unreachable server.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, backend='keras', tflite_quantization='none',
+                 policy_name='ensemble', pool_size=8, timeout=30):
+        self.address, self.family = parse_address(address)
+        self.authkey = require_authkey(authkey)
+        self.timeout = float(timeout)
+        # Reported configuration (used for cache namespacing); the server owns the real models
+        self.backend = backend
+        self.tflite_quantization = tflite_quantization
+        self.policy_name = policy_name
+        self.pool_size = max(1, int(pool_size))
+        self._pool = queue.LifoQueue()
+        self._ready = False
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, family=self.family, authkey=self.authkey)
+            limit_send_time(conn, self.timeout)
+            return conn
+
+    def _release(self, conn):
+        if self._pool.qsize() < self.pool_size:
+            self._pool.put(conn)
+        else:
+            conn.close()
+
+    def _request(self, command, arg=None, payload=None):
+        # A pooled connection may belong to a server that has since restarted: retry once on a fresh one
+        for attempt in range(2):
+            try:
+                conn = self._acquire()
+            except AuthenticationError:
+                self._ready = False
+                raise ConnectionError('authentication with model server failed')
+            except OSError as e:
+                self._ready = False
+                raise ConnectionError(f'Model server unreachable at {self.address}: {e}')
+            try:
+                conn.send((command, arg))
+                if payload is not None:
+                    conn.send_bytes(payload)
+                answered = conn.poll(self.timeout)
+                if answered:
+                    status, reply = conn.recv()
+            except BlockingIOError:
+                # The send timed out: the server stopped reading
+                answered = False
+            except (EOFError, OSError) as e:
+                conn.close()
+                self._ready = False
+                if attempt:
+                    raise ConnectionError(f'Lost connection to model server: {e}')
+                continue
+            if not answered:
+                # A reply may still arrive later (or half a request was sent), so the connection can't be reused
+                conn.close()
+                self._ready = False
+                raise ConnectionError(f'Model server did not answer within {self.timeout:g} s')
+            self._release(conn)
+            if status == 'error':
+                raise RuntimeError(reply)
+            return reply
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def load(self):
+        """Models load in the server process; just wait for it"""
+        self.wait_until_ready()
+
+    def start_background_load(self):
+        pass
+
+    def wait_until_ready(self, timeout=None):
+        """Poll the server until its models are ready or the timeout expires"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ready:
+            self._ready = self.readiness()['ready']
+            if self._ready or (deadline is not None and time.monotonic() >= deadline):
+                break
+            time.sleep(0.25)
+        return self._ready
+
+    def readiness(self):
+        try:
+            readiness = self._request('readiness')
+        except (ConnectionError, RuntimeError) as e:
+            return {'ready': False, 'backend': self.backend, 'error': str(e), 'model_server': str(self.address)}
+        return dict(readiness, model_server=str(self.address))
+
+    def classify_batch(self, images, quality_scores=None):
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        scores = None if quality_scores is None else [None if score is None else float(score) for score in quality_scores]
+        return self._request('classify', (images.shape, scores), memoryview(images).cast('B'))
+
+    def server_stats(self):
+        try:
+            return self._request('stats')
+        except (ConnectionError, RuntimeError) as e:
+            return {'error': str(e)}
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='EcoSort shared model server')
+    parser.add_argument('--address', default=os.getenv('MODEL_SERVER') or DEFAULT_ADDRESS,
+                        help='Unix socket path or host:port')
+    parser.add_argument('--allow-remote', action='store_true',
+                        default=os.getenv('MODEL_SERVER_ALLOW_REMOTE', 'false').lower() == 'true',
+                        help='allow a TCP address that is not loopback')
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    registry = ModelRegistry.from_env()
+    try:
+        server = ModelServer(
+            registry,
+            address=args.address,
+            authkey=os.getenv('MODEL_SERVER_AUTHKEY'),
+            max_batch_size=int(os.getenv('BATCH_MAX_SIZE', 8)),
+            max_wait_ms=float(os.getenv('BATCH_MAX_WAIT_MS', 10)),
+            allow_remote=args.allow_remote
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    # Listen right away so web workers can report loading progress on /api/ready
+    registry.start_background_load()
+    # Exit through the Listener's context manager on SIGTERM so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
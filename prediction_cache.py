@@ -0,0 +1,166 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from database import Database
+
+HASH_MODES = ['exact', 'perceptual']
+
+
+def exact_hash(image):
+    """SHA-256 of the decoded pixel data"""
+    pixels = np.ascontiguousarray(image)
+    return hashlib.sha256(pixels.tobytes() + str(pixels.shape).encode()).hexdigest()
+
+
+def perceptual_hash(image, hash_size=8):
+    """
+    64-bit difference hash (dHash) of a decoded image.
+    Re-encoded or slightly rescaled copies of the same photo share a hash.
+    """
+    pixels = np.asarray(image)
+    if pixels.dtype != np.uint8:
+        pixels = (np.clip(pixels, 0, 1) * 255).astype(np.uint8)
+    gray = Image.fromarray(pixels).convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    gray = np.asarray(gray, dtype=np.int16)
+    bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+    return f'{int("".join("1" if b else "0" for b in bits), 2):016x}'
+
+
+def image_digest(image, hash_mode='exact'):
+    """Content digest of a decoded image for the given hash mode"""
+    return perceptual_hash(image) if hash_mode == 'perceptual' else exact_hash(image)
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache of prediction results keyed on image content.
+    Optionally backed by a SQLite table so entries survive restarts.
+    Values must be JSON-serializable; they are stored serialized so memory
+    use can be reported exactly and callers can't mutate cached entries.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, hash_mode='exact', db_path=None, namespace=''):
+        if hash_mode not in HASH_MODES:
+            raise ValueError(f'Unknown hash mode: {hash_mode}')
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds) if ttl_seconds else None
+        self.hash_mode = hash_mode
+        self.db_path = db_path
+        # Namespace keys by model configuration so persisted entries never cross model versions
+        self.namespace = namespace
+
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts = 0
+
+        self._db = None
+        if db_path:
+            self._db = Database(db_path, pool_size=4)
+            with self._db.connection() as conn:
+                conn.execute('''CREATE TABLE IF NOT EXISTS prediction_cache
+                                (key TEXT PRIMARY KEY,
+                                 value TEXT,
+                                 created_at REAL)''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_prediction_cache_created ON prediction_cache (created_at)')
+
+    def key(self, image):
+        return self.key_for_digest(image_digest(image, self.hash_mode))
+
+    def key_for_digest(self, digest):
+        """Cache key for a digest computed elsewhere (e.g. in a preprocessing worker)"""
+        return f'{self.namespace}:{self.hash_mode}:{digest}'
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _store(self, key, value, created_at):
+        """Insert into the in-memory LRU; caller holds the lock"""
+        if key in self._entries:
+            self._memory_bytes -= len(self._entries.pop(key)[0])
+        self._entries[key] = (value, created_at)
+        self._memory_bytes += len(value)
+        while len(self._entries) > self.max_entries:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _disk_get(self, key):
+        with self._db.connection() as conn:
+            return conn.execute('SELECT value, created_at FROM prediction_cache WHERE key = ?', (key,)).fetchone()
+
+    def _disk_put(self, key, value, created_at):
+        with self._db.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO prediction_cache (key, value, created_at) VALUES (?, ?, ?)',
+                         (key, value, created_at))
+            if self.ttl is not None and self._puts % 100 == 0:
+                conn.execute('DELETE FROM prediction_cache WHERE created_at < ?', (time.time() - self.ttl,))
+
+    def get(self, key):
+        """Return the cached value or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(value)
+                self._memory_bytes -= len(self._entries.pop(key)[0])
+
+        if self._db is not None:
+            row = self._disk_get(key)
+            if row is not None and not self._expired(row[1]):
+                with self._lock:
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                return json.loads(row[0])
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        serialized = json.dumps(value)
+        created_at = time.time()
+        with self._lock:
+            self._store(key, serialized, created_at)
+            self._puts += 1
+        if self._db is not None:
+            self._disk_put(key, serialized, created_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+        if self._db is not None:
+            with self._db.connection() as conn:
+                conn.execute('DELETE FROM prediction_cache')
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hash_mode': self.hash_mode,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'memory_bytes': self._memory_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0,
+                'persistent': bool(self.db_path)
+            }
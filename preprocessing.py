@@ -0,0 +1,220 @@
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from prediction_cache import image_digest
+from quality import QUALITY_SIZE, quality_buffer
+
+IMAGE_SIZE = (224, 224)
+INPUT_SHAPE = (IMAGE_SIZE[1], IMAGE_SIZE[0], 3)
+BUFFER_SHAPE = (QUALITY_SIZE[1], QUALITY_SIZE[0])
+EXECUTORS = ['thread', 'process']
+
+
+def decode_image(data):
+    """Decode upload bytes (or a file path) into an RGB PIL image"""
+    source = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    with Image.open(source) as img:
+        img.load()
+        return img if img.mode == 'RGB' else img.convert('RGB')
+
+
+def to_model_input(img):
+    """Normalized 224x224 RGB array (same as Keras load_img + img_to_array)"""
+    if img.size != IMAGE_SIZE:
+        img = img.resize(IMAGE_SIZE, Image.NEAREST)
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+def prepare_into(data, index, inputs, buffers, hash_mode=None):
+    """
+    Decode one upload and write its model input and quality buffer into row
+    `index` of the batch arrays. Returns the content digest for the
+    prediction cache (None when hash_mode is None).
+    """
+    img = decode_image(data)
+    inputs[index] = to_model_input(img)
+    buffers[index] = quality_buffer(img)
+    return image_digest(np.asarray(img), hash_mode) if hash_mode else None
+
+
+def _attach(name):
+    """Attach to a parent-owned shared memory block without taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the block, but spawned workers share the
+        # parent's resource tracker, so the parent's unlink() still clears it
+        return shared_memory.SharedMemory(name=name)
+
+
+def _prepare_shared(data, index, count, inputs_name, buffers_name, hash_mode):
+    """Process-pool entry point: fill one row of the parent's shared-memory batch"""
+    inputs_shm = _attach(inputs_name)
+    buffers_shm = _attach(buffers_name)
+    inputs = np.ndarray((count,) + INPUT_SHAPE, dtype=np.float32, buffer=inputs_shm.buf)
+    buffers = np.ndarray((count,) + BUFFER_SHAPE, dtype=np.uint8, buffer=buffers_shm.buf)
+    error = None
+    try:
+        digest = prepare_into(data, index, inputs, buffers, hash_mode)
+    except Exception as e:
+        # Keep only the message: the traceback would pin the views and block close()
+        error = str(e)
+    # Views must be released before the mappings can be closed
+    del inputs, buffers
+    inputs_shm.close()
+    buffers_shm.close()
+    if error is not None:
+        raise ValueError(error)
+    return digest
+
+
+class PreparedBatch:
+    """
+    Decoded uploads ready for inference.
+    inputs  - (N, 224, 224, 3) float32 model inputs
+    buffers - (N, 256, 256) uint8 quality buffers
+    digests - content digest per row (None without a cache)
+    errors  - None per row, or the decode error message
+    Call close() once done so shared memory is released.
+    """
+
+    def __init__(self, inputs, buffers, shared=()):
+        self.inputs = inputs
+        self.buffers = buffers
+        self.digests = [None] * len(inputs)
+        self.errors = [None] * len(inputs)
+        self._shared = shared
+
+    @property
+    def ok_rows(self):
+        return [i for i, error in enumerate(self.errors) if error is None]
+
+    def close(self):
+        self.inputs = self.buffers = None
+        for shm in self._shared:
+            try:
+                shm.close()
+            except BufferError:
+                # A caller still holds a view; the mapping goes away when it's collected
+                pass
+            shm.unlink()
+        self._shared = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PendingBatch:
+    """A batch whose rows are still being decoded by the pool"""
+
+    def __init__(self, stage, batch, futures):
+        self._stage = stage
+        self._batch = batch
+        self._futures = futures
+        self._done = False
+
+    def result(self):
+        if not self._done:
+            for index, future in self._futures:
+                try:
+                    self._batch.digests[index] = future.result()
+                except Exception as e:
+                    self._batch.errors[index] = str(e)
+            self._stage.decode_errors += sum(error is not None for error in self._batch.errors)
+            self._done = True
+        return self._batch
+
+
+class PreprocessingStage:
+    """
+    Decode/resize/normalize stage in front of inference.
+    workers=0 runs inline on the request thread. Otherwise uploads are decoded
+    in parallel by a thread pool (PIL releases the GIL while decoding and
+    resampling) or a process pool. Worker processes write their rows straight
+    into a shared-memory batch tensor, so only the upload bytes and a short
+    digest cross the process boundary. submit() returns immediately, which lets
+    callers decode the next batch while TensorFlow runs the current one.
+    """
+
+    def __init__(self, workers=0, executor='thread', hash_mode=None):
+        if executor not in EXECUTORS:
+            raise ValueError(f'Unknown preprocessing executor: {executor}')
+        self.workers = max(0, int(workers))
+        self.executor = executor
+        self.hash_mode = hash_mode
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.images_prepared = 0
+        self.decode_errors = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    if self.executor == 'process':
+                        # spawn, not fork: forking a process that has TensorFlow threads running can deadlock
+                        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                    else:
+                        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='preprocess')
+        return self._pool
+
+    def submit(self, datas):
+        """Start decoding a list of upload bytes; returns a PendingBatch"""
+        count = len(datas)
+        self.images_prepared += count
+
+        if self.workers == 0:
+            batch = PreparedBatch(np.empty((count,) + INPUT_SHAPE, dtype=np.float32),
+                                  np.empty((count,) + BUFFER_SHAPE, dtype=np.uint8))
+            for index, data in enumerate(datas):
+                try:
+                    batch.digests[index] = prepare_into(data, index, batch.inputs, batch.buffers, self.hash_mode)
+                except Exception as e:
+                    batch.errors[index] = str(e)
+            return PendingBatch(self, batch, [])
+
+        pool = self._get_pool()
+        if self.executor == 'process':
+            inputs_shm = shared_memory.SharedMemory(create=True, size=max(1, count * int(np.prod(INPUT_SHAPE)) * 4))
+            buffers_shm = shared_memory.SharedMemory(create=True, size=max(1, count * int(np.prod(BUFFER_SHAPE))))
+            batch = PreparedBatch(
+                np.ndarray((count,) + INPUT_SHAPE, dtype=np.float32, buffer=inputs_shm.buf),
+                np.ndarray((count,) + BUFFER_SHAPE, dtype=np.uint8, buffer=buffers_shm.buf),
+                shared=(inputs_shm, buffers_shm)
+            )
+            futures = [(index, pool.submit(_prepare_shared, data, index, count,
+                                           inputs_shm.name, buffers_shm.name, self.hash_mode))
+                       for index, data in enumerate(datas)]
+        else:
+            batch = PreparedBatch(np.empty((count,) + INPUT_SHAPE, dtype=np.float32),
+                                  np.empty((count,) + BUFFER_SHAPE, dtype=np.uint8))
+            futures = [(index, pool.submit(prepare_into, data, index, batch.inputs, batch.buffers, self.hash_mode))
+                       for index, data in enumerate(datas)]
+
+        return PendingBatch(self, batch, futures)
+
+    def prepare(self, datas):
+        """Decode a list of upload bytes and wait for the result"""
+        return self.submit(datas).result()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'executor': self.executor if self.workers else 'inline',
+            'images_prepared': self.images_prepared,
+            'decode_errors': self.decode_errors
+        }
@@ -0,0 +1,91 @@
+import numpy as np
+from PIL import Image
+
+# Quality metrics run on a small grayscale copy instead of the full-resolution upload
+QUALITY_SIZE = (256, 256)
+
+DARK_THRESHOLD = 50
+BRIGHT_THRESHOLD = 200
+BLUR_THRESHOLD = 100
+LOW_CONTRAST_THRESHOLD = 20
+CLIPPING_THRESHOLD = 0.25
+CLIP_LOW = 5
+CLIP_HIGH = 250
+
+
+def quality_buffer(img):
+    """
+    Downsample a decoded PIL image to a QUALITY_SIZE grayscale array.
+    BOX resampling (with PIL's reduce() fast path for large images) averages
+    pixels instead of skipping them, so blur is measured on real image
+    content rather than aliasing.
+    """
+    small = img.resize(QUALITY_SIZE, Image.BOX, reducing_gap=2.0)
+    return np.asarray(small.convert('L'), dtype=np.uint8)
+
+
+def laplacian_variance(gray):
+    """Variance of the 4-neighbour Laplacian for a (N, H, W) batch of grayscale images"""
+    lap = (gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:]
+           - 4 * gray[:, 1:-1, 1:-1])
+    return lap.reshape(len(gray), -1).var(axis=1)
+
+
+def analyze_batch(buffers, blur_threshold=BLUR_THRESHOLD):
+    """
+    Score a (N, H, W) uint8 batch of quality buffers at once.
+    Returns one quality_check dict per image with the score, feedback and
+    brightness, blur (variance of Laplacian), contrast and clipping metrics.
+    """
+    gray = np.asarray(buffers, dtype=np.float32)
+    if gray.ndim == 2:
+        gray = gray[np.newaxis]
+    flat = gray.reshape(len(gray), -1)
+
+    brightness = flat.mean(axis=1)
+    contrast = flat.std(axis=1)
+    blur_score = laplacian_variance(gray)
+    dark_clipping = (flat <= CLIP_LOW).mean(axis=1)
+    bright_clipping = (flat >= CLIP_HIGH).mean(axis=1)
+
+    too_dark = brightness < DARK_THRESHOLD
+    too_bright = ~too_dark & (brightness > BRIGHT_THRESHOLD)
+    blurry = blur_score < blur_threshold
+    low_contrast = contrast < LOW_CONTRAST_THRESHOLD
+    clipped = ~too_dark & ~too_bright & ((dark_clipping > CLIPPING_THRESHOLD) | (bright_clipping > CLIPPING_THRESHOLD))
+
+    scores = (100 - 30 * too_dark - 20 * too_bright - 25 * blurry
+              - 10 * low_contrast - 10 * clipped)
+    scores = np.maximum(0, scores)
+
+    results = []
+    for i in range(len(gray)):
+        feedback = []
+        if too_dark[i]:
+            feedback.append("⚠️ Image is too dark - try better lighting")
+        elif too_bright[i]:
+            feedback.append("⚠️ Image is too bright - reduce lighting")
+        if blurry[i]:
+            feedback.append("⚠️ Image appears blurry - hold camera steady")
+        if low_contrast[i]:
+            feedback.append("⚠️ Low contrast - use a plain background that differs from the item")
+        if clipped[i]:
+            feedback.append("⚠️ Parts of the image are over/under-exposed - avoid glare and harsh shadows")
+        if not feedback:
+            feedback.append("✅ Image quality is good!")
+
+        results.append({
+            'score': int(scores[i]),
+            'feedback': feedback,
+            'brightness': round(float(brightness[i]), 2),
+            'blur_score': round(float(blur_score[i]), 2),
+            'contrast': round(float(contrast[i]), 2),
+            'dark_clipping': round(float(dark_clipping[i]) * 100, 2),
+            'bright_clipping': round(float(bright_clipping[i]) * 100, 2)
+        })
+    return results
+
+
+def analyze(buffer, blur_threshold=BLUR_THRESHOLD):
+    """Score a single (H, W) quality buffer"""
+    return analyze_batch(buffer[np.newaxis], blur_threshold)[0]
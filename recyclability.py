@@ -0,0 +1,108 @@
+import json
+import os
+from types import MappingProxyType
+
+import numpy as np
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recyclability_rules.json')
+
+
+def _frozen(values, dtype):
+    array = np.array(values, dtype=dtype)
+    array.setflags(write=False)
+    return array
+
+
+class RecyclabilityRules:
+    """
+    Recyclability and eco-score rules compiled from a versioned JSON table.
+    Each category gets a row index; the per-category values live in read-only
+    arrays (for scoring whole batches at once) and tuples (for single
+    predictions), with unknown categories mapped to the table's default row.
+    """
+
+    def __init__(self, config):
+        try:
+            self.version = str(config['version'])
+            categories = config['categories']
+            default = config['default']
+            eco = config['eco_score']
+            self.min_confidence = float(config['min_confidence'])
+            self.poor_quality_below = float(config['poor_quality']['below'])
+            self.poor_quality_penalty = float(config['poor_quality']['confidence_penalty'])
+            self.poor_quality_note = config['poor_quality']['note']
+            self.low_confidence_below = float(config['low_confidence']['below'])
+            self.low_confidence_penalty = float(config['low_confidence']['confidence_penalty'])
+            self.confident_above = float(eco['confident_above'])
+            self.sharp_above = float(eco['sharp_above'])
+
+            rows = []
+            for rule in list(categories.values()) + [default]:
+                group = eco['recyclable' if rule['recyclable'] else 'non_recyclable']
+                rows.append((bool(rule['recyclable']), float(rule['base_confidence']), rule['reason'],
+                             group['base'] + rule.get('eco_bonus', 0), group['confident_bonus'], group['sharp_bonus']))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Invalid recyclability rules: missing or malformed {e}') from e
+
+        self.categories = tuple(name.lower() for name in categories)
+        self.index = MappingProxyType({name: i for i, name in enumerate(self.categories)})
+        self.default_index = len(self.categories)
+        self.rows = tuple(rows)
+        recyclable, base_confidence, reasons, eco_base, confident_bonus, sharp_bonus = zip(*rows)
+        self.recyclable = _frozen(recyclable, bool)
+        self.base_confidence = _frozen(base_confidence, np.float64)
+        self.reasons = reasons
+        self.eco_base = _frozen(eco_base, np.int64)
+        self.confident_bonus = _frozen(confident_bonus, np.int64)
+        self.sharp_bonus = _frozen(sharp_bonus, np.int64)
+
+    @classmethod
+    def load(cls, path=DEFAULT_RULES_PATH):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def score(self, category, confidence, quality_score):
+        """(is_recyclable, recyclable_confidence, reason, eco_score) for one prediction"""
+        recyclable, recyclable_confidence, reason, eco_score, confident_bonus, sharp_bonus = \
+            self.rows[self.index.get(category.lower(), self.default_index)]
+
+        # Adjust confidence based on image quality, then on the classifier's confidence
+        if quality_score < self.poor_quality_below:
+            recyclable_confidence = max(self.min_confidence, recyclable_confidence - self.poor_quality_penalty)
+            reason += self.poor_quality_note
+        if confidence < self.low_confidence_below:
+            recyclable_confidence = max(self.min_confidence, recyclable_confidence - self.low_confidence_penalty)
+
+        # Eco-score (0-100)
+        if confidence > self.confident_above:
+            eco_score += confident_bonus
+        if quality_score > self.sharp_above:
+            eco_score += sharp_bonus
+        return recyclable, recyclable_confidence, reason, min(100, max(0, eco_score))
+
+    def score_batch(self, categories, confidences, quality_scores):
+        """score() for a whole batch in one vectorized pass; returns one tuple per prediction"""
+        if not len(categories):
+            return []
+        rows = np.array([self.index.get(category.lower(), self.default_index) for category in categories], dtype=np.intp)
+        confidences = np.asarray(confidences, dtype=np.float64)
+        quality_scores = np.asarray(quality_scores, dtype=np.float64)
+
+        poor_quality = quality_scores < self.poor_quality_below
+        recyclable_confidence = self.base_confidence[rows]
+        recyclable_confidence = np.where(
+            poor_quality, np.maximum(self.min_confidence, recyclable_confidence - self.poor_quality_penalty),
+            recyclable_confidence)
+        recyclable_confidence = np.where(
+            confidences < self.low_confidence_below,
+            np.maximum(self.min_confidence, recyclable_confidence - self.low_confidence_penalty),
+            recyclable_confidence)
+
+        eco_scores = (self.eco_base[rows]
+                      + np.where(confidences > self.confident_above, self.confident_bonus[rows], 0)
+                      + np.where(quality_scores > self.sharp_above, self.sharp_bonus[rows], 0))
+        eco_scores = np.clip(eco_scores, 0, 100)
+
+        reasons = [self.reasons[row] + self.poor_quality_note if poor else self.reasons[row]
+                   for row, poor in zip(rows.tolist(), poor_quality.tolist())]
+        return list(zip(self.recyclable[rows].tolist(), recyclable_confidence.tolist(), reasons, eco_scores.tolist()))
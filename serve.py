@@ -0,0 +1,116 @@
+"""
+Production launcher: serves asgi.app with uvicorn.
+
+Usage:
+    python serve.py                         # tuned defaults for this machine
+    python serve.py --port 8080 --workers 2
+    python serve.py --model-server          # one shared model process, one web worker per CPU
+    python serve.py --print-config          # show the effective settings and exit
+
+Thread counts default to values derived from the CPU count; anything already
+set in the environment or .env wins.
+"""
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+
+from dotenv import load_dotenv
+
+
+def tuned_defaults(workers, model_server=False):
+    """Thread/queue settings for `workers` web processes (plus an optional model server) on this machine"""
+    cpus = os.cpu_count() or 1
+    per_worker = max(1, cpus // workers)
+    micro_batching = os.getenv('ENABLE_MICRO_BATCHING', 'true').lower() == 'true'
+    batch_size = int(os.getenv('BATCH_MAX_SIZE', 8))
+    # TensorFlow splits each forward pass across these threads; a shared model server gets every core
+    tf_threads = cpus if model_server else per_worker
+    return {
+        'TF_NUM_INTRAOP_THREADS': str(tf_threads),
+        'TF_NUM_INTEROP_THREADS': '2',
+        'OMP_NUM_THREADS': str(tf_threads),
+        # With micro-batching, enough request threads to fill one batch while the previous one runs
+        'ASGI_INFERENCE_WORKERS': str(batch_size if micro_batching else per_worker),
+        'ASGI_INFERENCE_QUEUE': str(4 * (batch_size if micro_batching else per_worker)),
+        'ASGI_DB_WORKERS': str(min(4, per_worker + 1)),
+        'ASGI_DB_QUEUE': '64',
+        'ASGI_WEB_WORKERS': str(min(16, per_worker * 2 + 2)),
+        'ASGI_WEB_QUEUE': '128',
+        'PREPROCESS_WORKERS': os.getenv('PREPROCESS_WORKERS', str(min(4, per_worker))),
+        # Load models before accepting traffic instead of answering 503s at startup
+        # (with a model server the web workers only wait for it per request)
+        'MODEL_LOADING': 'background' if model_server else 'eager',
+    }
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Serve EcoSort AI with an ASGI server')
+    parser.add_argument('--host', default=os.getenv('SERVE_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('SERVE_PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=os.getenv('SERVE_WORKERS'),
+                        help='web processes (default: 1, or one per CPU with --model-server)')
+    parser.add_argument('--model-server', action='store_true', default=os.getenv('SERVE_MODEL_SERVER', 'false').lower() == 'true',
+                        help='load the models once in a separate process shared by all web workers')
+    parser.add_argument('--limit-concurrency', type=int, default=int(os.getenv('SERVE_LIMIT_CONCURRENCY', 1000)),
+                        help='open connections per process before new ones get 503')
+    parser.add_argument('--keep-alive', type=int, default=int(os.getenv('SERVE_KEEP_ALIVE', 15)),
+                        help='seconds to hold idle keep-alive connections')
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    parser.add_argument('--print-config', action='store_true', help='print the effective settings and exit')
+    args = parser.parse_args()
+
+    if args.workers is None:
+        workers = (os.cpu_count() or 1) if args.model_server else 1
+    else:
+        workers = max(1, int(args.workers))
+    if args.model_server:
+        from model_server import DEFAULT_ADDRESS
+        os.environ.setdefault('MODEL_SERVER', DEFAULT_ADDRESS)
+        os.environ.setdefault('MODEL_SERVER_AUTHKEY', secrets.token_hex(16))
+        # The model server batches across all workers; a second per-worker queue would only add latency.
+        # Set before the tuned defaults, which size the inference executor from it
+        os.environ.setdefault('ENABLE_MICRO_BATCHING', 'false')
+    defaults = tuned_defaults(workers, args.model_server)
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+    if args.print_config:
+        for name in sorted(defaults) + (['MODEL_SERVER', 'ENABLE_MICRO_BATCHING'] if args.model_server else []):
+            print(f"{name}={os.environ[name]}")
+        return
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn is not installed - run `pip install uvicorn`")
+        sys.exit(1)
+
+    model_server = None
+    if args.model_server:
+        model_server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_server.py'),
+                                         '--address', os.environ['MODEL_SERVER']])
+
+    print(f"🚀 Serving on http://{args.host}:{args.port} with {workers} worker process(es)")
+    try:
+        uvicorn.run(
+            'asgi:app',
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            lifespan='on',
+            limit_concurrency=args.limit_concurrency,
+            timeout_keep_alive=args.keep_alive,
+            backlog=2048,
+            access_log=args.access_log,
+        )
+    finally:
+        if model_server is not None:
+            model_server.terminate()
+            model_server.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
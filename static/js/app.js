@@ -490,7 +490,7 @@ async function loadHistory() {
             }
             historyGrid.innerHTML = history.map(item => `
                 <div class="history-card">
-                    <img src="/${item.image_path}" alt="${item.predicted_class}">
+                    ${item.thumbnail_path || item.image_path ? `<img src="/${item.thumbnail_path || item.image_path}" alt="${item.predicted_class}" loading="lazy">` : ''}
                     <div class="history-info">
                         <span class="history-category category-${item.predicted_class}">${item.predicted_class.toUpperCase().replace('_', ' ')}</span>
                         <span class="history-confidence">${item.confidence}%</span>
@@ -0,0 +1,50 @@
+"""Routes that asgi.py serves natively must still show up in /metrics"""
+import asyncio
+import importlib
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def asgi_app(tmp_path_factory):
+    workspace = tmp_path_factory.mktemp('asgi')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(workspace)
+        monkeypatch.setenv('DATABASE_PATH', os.path.join(workspace, 'test.db'))
+        monkeypatch.setenv('CHAT_BACKEND', 'fake')
+        monkeypatch.setenv('MODEL_LOADING', 'lazy')
+        monkeypatch.setenv('PREDICTION_CACHE', 'false')
+        monkeypatch.delenv('MODEL_SERVER', raising=False)
+        yield importlib.import_module('asgi').app
+
+
+def call(app, method, path, body=b'', headers=()):
+    """Drive one HTTP request through the ASGI app; returns (status, body)"""
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': list(headers)}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]['status'], sent[1]['body']
+
+
+def test_native_routes_are_recorded(asgi_app):
+    # Neither request needs the models: both are rejected before inference
+    assert call(asgi_app, 'POST', '/api/predict')[0] == 400
+    assert call(asgi_app, 'POST', '/api/predict/batch')[0] == 400
+    chat = json.dumps({'message': 'How do I recycle glass?'}).encode()
+    assert call(asgi_app, 'POST', '/api/chat', chat, [(b'content-type', b'application/json')])[0] == 200
+
+    status, body = call(asgi_app, 'GET', '/metrics')
+    assert status == 200
+    metrics = body.decode()
+    for route, status in (('/api/predict', 400), ('/api/predict/batch', 400), ('/api/chat', 200)):
+        assert f'ecosort_request_seconds_count{{method="POST",route="{route}",status="{status}"}} 1' in metrics
@@ -0,0 +1,82 @@
+"""The trigger-maintained statistics rollups must match a full scan of classifications"""
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database import Database
+
+
+def sqlite_time(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'rollups.db'), pool_size=2)
+    db.init_schema()
+    yield db
+    db.close()
+
+
+def make_rows(now):
+    """Rows spread over ten days, plus rows either side of the 7-day window start and on its partial oldest day"""
+    rng = random.Random(0)
+    classes = ['glass', 'metal', 'paper', 'plastic', 'trash', 'e_waste']
+    window_start = now - timedelta(days=7)
+    oldest_day = window_start.replace(hour=0, minute=0, second=0)
+    moments = [now - timedelta(seconds=rng.uniform(0, 10 * 86400)) for _ in range(300)]
+    moments += [window_start + timedelta(minutes=1), window_start - timedelta(minutes=1),
+                oldest_day + timedelta(seconds=1), oldest_day + timedelta(hours=23, minutes=59, seconds=59)]
+    rows = []
+    for i, moment in enumerate(moments):
+        if i % 10 == 0:
+            # Older rows have no recyclability or eco-score
+            recyclable, recyclable_confidence, eco_score = None, None, None
+        else:
+            recyclable, recyclable_confidence, eco_score = i % 3 != 0, rng.uniform(50, 95), rng.randint(0, 100)
+        rows.append((None, rng.choice(classes), rng.uniform(20, 100), '{}', recyclable, recyclable_confidence,
+                     eco_score, '1', sqlite_time(moment)))
+    return rows
+
+
+def assert_matches_full_scan(db):
+    stats = db.get_statistics()
+    full = db.get_statistics_full_scan()
+    assert stats['by_category'] == full['by_category']
+    for key in full:
+        if key != 'by_category':
+            assert stats[key] == pytest.approx(full[key]), key
+    return stats
+
+
+def test_rollups_match_full_scan_after_inserts_and_deletes(db):
+    now = datetime.now(timezone.utc)
+    rows = make_rows(now)
+    db.save_batch(rows)
+    stats = assert_matches_full_scan(db)
+    assert stats['total'] == len(rows)
+    # Independent count of the rolling window (the two rows right at its start are a minute away from it)
+    window_start = sqlite_time(now - timedelta(days=7))
+    assert stats['this_week'] == sum(row[-1] >= window_start for row in rows)
+
+    with db.connection() as conn:
+        conn.execute('DELETE FROM classifications WHERE id % 4 = 0')
+        conn.execute("DELETE FROM classifications WHERE predicted_class = 'e_waste'")
+    stats = assert_matches_full_scan(db)
+    assert 'e_waste' not in stats['by_category']
+
+
+def test_rebuild_matches_triggers(db):
+    db.save_batch(make_rows(datetime.now(timezone.utc)))
+    with db.connection() as conn:
+        # Drift the rollups so the rebuild has something to fix
+        conn.execute('DELETE FROM stats_daily')
+        conn.execute('UPDATE stats_totals SET total = total + 5')
+    db.rebuild_statistics()
+    assert_matches_full_scan(db)
+
+
+def test_empty_database(db):
+    assert_matches_full_scan(db)
+    assert db.get_statistics()['this_week'] == 0
@@ -0,0 +1,85 @@
+import os
+import threading
+
+import numpy as np
+
+# Prefer the standalone interpreter packages; fall back to the one bundled with TensorFlow
+try:
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+
+QUANTIZATION_MODES = ['none', 'dynamic', 'float16', 'int8']
+
+
+def tflite_path(model_path, quantization='none', output_dir=None):
+    """Map a Keras .h5 path to its converted .tflite path, e.g. my_model.h5 -> my_model_int8.tflite"""
+    base = os.path.splitext(os.path.basename(model_path))[0]
+    suffix = '' if quantization == 'none' else f'_{quantization}'
+    directory = output_dir if output_dir is not None else os.path.dirname(model_path)
+    return os.path.join(directory, f'{base}{suffix}.tflite')
+
+
+class TFLiteModel:
+    """
+    Minimal Keras-compatible wrapper around a TFLite interpreter.
+    Exposes predict(), predict_on_batch() and output_shape so it can stand in
+    for a Keras model.
+    """
+
+    def __init__(self, path, num_threads=None):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'TFLite model not found: {path}')
+        self.path = path
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # Interpreters are not thread-safe
+        self._lock = threading.Lock()
+
+    @property
+    def output_shape(self):
+        return (None,) + tuple(int(d) for d in self._output['shape'][1:])
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = [batch_size] + [int(d) for d in self._input['shape'][1:]]
+            self.interpreter.resize_tensor_input(self._input['index'], shape)
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def _quantize(self, images):
+        """Apply input quantization for models converted with integer inputs"""
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return images.astype(np.float32)
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(images / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, outputs):
+        if self._output['dtype'] == np.float32:
+            return outputs
+        scale, zero_point = self._output['quantization']
+        return (outputs.astype(np.float32) - zero_point) * scale
+
+    def predict(self, images, **kwargs):
+        images = np.asarray(images)
+        with self._lock:
+            self._resize(len(images))
+            self.interpreter.set_tensor(self._input['index'], self._quantize(images))
+            self.interpreter.invoke()
+            outputs = self.interpreter.get_tensor(self._output['index']).copy()
+        return self._dequantize(outputs)
+
+    def predict_on_batch(self, images):
+        # The interpreter always runs the whole input as one batch
+        return self.predict(images)
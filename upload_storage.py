@@ -0,0 +1,257 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+
+from PIL import Image, ImageOps, features
+
+from upload_writer import write_file
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'thumbs'
+
+# Leading bytes of each format we accept, so identical content always gets one name
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'BM', 'bmp'),
+]
+
+
+def sniff_extension(data):
+    """File extension for the image format of data (None if it isn't a format we accept)"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    return None
+
+
+def make_thumbnail(data, size, image_format, quality=80):
+    """Encode a thumbnail that fits in size x size pixels"""
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEG decoders can downscale by 1/2-1/8 while decoding, so big photos never decode at full size
+        img.draft('RGB', (size, size))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, format=image_format.upper(), quality=quality)
+        return buffer.getvalue()
+
+
+class UploadStorage:
+    """
+    Content-addressed store for uploaded originals and their thumbnails.
+    Files are named after the SHA-256 of their bytes (root/ab/abcdef....jpg),
+    so re-uploads of the same image share one file; thumbnails for the
+    history view live under root/thumbs/ with the same name. Retention drops
+    the least recently uploaded originals once they exceed max_age_days or
+    the total exceeds max_bytes, together with their thumbnails, and clears
+    the image_path of classifications that pointed at them.
+    """
+
+    def __init__(self, root, thumbnail_size=256, thumbnail_format='webp', max_bytes=0, max_age_days=0,
+                 sweep_interval=3600):
+        self.root = root
+        self.thumbnail_size = int(thumbnail_size)
+        if thumbnail_format == 'webp' and not features.check('webp'):
+            logger.warning('Pillow was built without WebP support - using JPEG thumbnails')
+            thumbnail_format = 'jpeg'
+        self.thumbnail_format = thumbnail_format
+        self.thumbnail_extension = 'jpg' if thumbnail_format == 'jpeg' else thumbnail_format
+        self.max_bytes = int(max_bytes)
+        self.max_age = float(max_age_days) * 86400
+        self.sweep_interval = float(sweep_interval)
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.stored = 0
+        self.deduplicated = 0
+        self.thumbnails = 0
+        self.thumbnail_failures = 0
+        self.last_sweep = None
+
+    @classmethod
+    def from_env(cls, root):
+        """Storage configured from THUMBNAIL_*, UPLOAD_MAX_MB, UPLOAD_MAX_AGE_DAYS and UPLOAD_SWEEP_INTERVAL"""
+        return cls(
+            root,
+            thumbnail_size=int(os.getenv('THUMBNAIL_SIZE', 256)),
+            thumbnail_format=os.getenv('THUMBNAIL_FORMAT', 'webp').lower(),
+            # Retention: 0 disables a limit
+            max_bytes=float(os.getenv('UPLOAD_MAX_MB', 0)) * 1024 * 1024,
+            max_age_days=float(os.getenv('UPLOAD_MAX_AGE_DAYS', 0)),
+            sweep_interval=float(os.getenv('UPLOAD_SWEEP_INTERVAL', 3600))
+        )
+
+    def path_for(self, data):
+        """Where the original for these bytes is (or will be) stored; None if they aren't an accepted image format"""
+        extension = sniff_extension(data)
+        if extension is None:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        return os.path.join(self.root, digest[:2], f'{digest}.{extension}')
+
+    def thumbnail_for(self, image_path):
+        """Thumbnail path for a stored original; None for anything that isn't content-addressed"""
+        if not image_path or not image_path.startswith(self.root + os.sep):
+            return None
+        relative = os.path.relpath(image_path, self.root)
+        directory, name = os.path.split(relative)
+        if len(directory) != 2 or os.sep in directory:
+            return None
+        return os.path.join(self.root, THUMBNAIL_DIR, directory, f'{os.path.splitext(name)[0]}.{self.thumbnail_extension}')
+
+    def preview_for(self, image_path):
+        """
+        What the UI should load for a classification: the thumbnail once it
+        has been written, otherwise the original (legacy uploads, failed or
+        still queued thumbnails). None when there is no original.
+        """
+        thumbnail_path = self.thumbnail_for(image_path)
+        if thumbnail_path is not None and os.path.exists(thumbnail_path):
+            return thumbnail_path
+        return image_path
+
+    def ingest(self, path, data):
+        """
+        Store an original at path (from path_for) and make its thumbnail.
+        Duplicates only get their modification time refreshed, which is
+        what retention treats as the upload time.
+        """
+        if os.path.exists(path):
+            os.utime(path)
+            with self._lock:
+                self.deduplicated += 1
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file(path, data)
+        with self._lock:
+            self.stored += 1
+
+        thumbnail_path = self.thumbnail_for(path)
+        try:
+            thumbnail = make_thumbnail(data, self.thumbnail_size, self.thumbnail_format)
+            os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+            write_file(thumbnail_path, thumbnail)
+            with self._lock:
+                self.thumbnails += 1
+        except Exception as e:
+            # The original is kept; history falls back to it
+            with self._lock:
+                self.thumbnail_failures += 1
+            logger.warning('Could not create thumbnail for %s: %s', path, e)
+
+    def _originals(self):
+        """(mtime, size, path) of every stored original, including legacy uuid_filename uploads"""
+        originals = []
+        for directory, subdirectories, files in os.walk(self.root):
+            if directory == self.root and THUMBNAIL_DIR in subdirectories:
+                subdirectories.remove(THUMBNAIL_DIR)
+            for name in files:
+                if name.endswith('.part'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                originals.append((stat.st_mtime, stat.st_size, path))
+        return originals
+
+    def sweep(self, db, now=None):
+        """
+        Apply retention: delete expired originals, then the least recently
+        uploaded ones until the store fits in max_bytes. Returns a summary.
+        """
+        now = time.time() if now is None else now
+        originals = sorted(self._originals())
+        thumbnail_bytes = {}
+        for path in (self.thumbnail_for(path) for _, _, path in originals):
+            if path is not None:
+                try:
+                    thumbnail_bytes[path] = os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+        total = sum(size for _, size, _ in originals) + sum(thumbnail_bytes.values())
+
+        removed = []
+        freed = 0
+        for mtime, size, path in originals:
+            expired = self.max_age and now - mtime > self.max_age
+            over_budget = self.max_bytes and total > self.max_bytes
+            if not (expired or over_budget):
+                # Sorted oldest first: nothing after this is expired either
+                break
+            try:
+                # Re-uploaded since the scan started: it is recent again
+                if os.stat(path).st_mtime != mtime:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            thumbnail_path = self.thumbnail_for(path)
+            released = size + thumbnail_bytes.get(thumbnail_path, 0)
+            if thumbnail_path in thumbnail_bytes:
+                try:
+                    os.remove(thumbnail_path)
+                except FileNotFoundError:
+                    pass
+            total -= released
+            freed += released
+            removed.append(path)
+
+        cleared = db.clear_image_paths(removed) if removed else 0
+        summary = {
+            'removed_files': len(removed),
+            'freed_bytes': freed,
+            'cleared_references': cleared,
+            'remaining_files': len(originals) - len(removed),
+            'remaining_bytes': total,
+            'finished_at': now
+        }
+        with self._lock:
+            self.last_sweep = summary
+        return summary
+
+    def start_sweeper(self, db):
+        """Run sweep() every sweep_interval seconds on a daemon thread (if any retention limit is set)"""
+        if self._sweeper is not None or self.sweep_interval <= 0 or not (self.max_bytes or self.max_age):
+            return
+
+        def run():
+            while True:
+                try:
+                    summary = self.sweep(db)
+                    if summary['removed_files']:
+                        logger.info('Upload retention removed %d files (%.1f MB)',
+                                    summary['removed_files'], summary['freed_bytes'] / 1024 / 1024)
+                except Exception:
+                    logger.exception('Upload retention sweep failed')
+                time.sleep(self.sweep_interval)
+
+        self._sweeper = threading.Thread(target=run, name='upload-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'root': self.root,
+                'stored': self.stored,
+                'deduplicated': self.deduplicated,
+                'thumbnails': self.thumbnails,
+                'thumbnail_failures': self.thumbnail_failures,
+                'thumbnail_format': self.thumbnail_format,
+                'thumbnail_size': self.thumbnail_size,
+                'max_bytes': self.max_bytes,
+                'max_age_days': self.max_age / 86400,
+                'sweep_interval_seconds': self.sweep_interval,
+                'last_sweep': self.last_sweep
+            }
@@ -0,0 +1,79 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def write_file(path, data):
+    # Write to a temp name first so readers never see a partial file; the name is
+    # unique per thread so concurrent writers of the same path can't collide
+    tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.part'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class UploadWriter:
+    """
+    Background writer for uploaded originals.
+    Requests hand over the raw bytes and get the destination path back
+    immediately; a daemon thread does the disk write off the critical path.
+    When the queue is full the write happens inline, which bounds memory.
+    write(path, data) does the actual work; by default the bytes are written
+    atomically to path.
+    """
+
+    def __init__(self, max_pending=256, write=None):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._write = write or write_file
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.inline_writes = 0
+        self.failed = 0
+        atexit.register(self.flush)
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='upload-writer', daemon=True)
+                self._worker.start()
+
+    def submit(self, path, data):
+        """Queue bytes to be written to path"""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((path, data))
+        except queue.Full:
+            self._write(path, data)
+            self.inline_writes += 1
+
+    def _run(self):
+        while True:
+            path, data = self._queue.get()
+            try:
+                self._write(path, data)
+                self.written += 1
+            except OSError as e:
+                self.failed += 1
+                logger.warning('Failed to save upload %s: %s', path, e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued upload is on disk"""
+        if self._worker is not None:
+            self._queue.join()
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'written': self.written,
+            'inline_writes': self.inline_writes,
+            'failed': self.failed
+        }
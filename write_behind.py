@@ -0,0 +1,345 @@
+import atexit
+import logging
+import queue
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from database import ACHIEVEMENTS
+
+logger = logging.getLogger(__name__)
+
+# Wakes the writer so a flush doesn't wait out the batching interval
+_FLUSH = object()
+
+
+class _StaleSnapshot(Exception):
+    """A batch started after the pending snapshot was taken has already been committed"""
+
+
+class PendingTotals:
+    """Statistics rollup deltas for rows that are queued but not yet committed"""
+
+    def __init__(self):
+        self.total = 0
+        self.recyclable_count = 0
+        self.non_recyclable_count = 0
+        self.confidence_sum = 0.0
+        self.confidence_count = 0
+        self.eco_score_sum = 0.0
+        self.eco_score_count = 0
+        self.by_category = {}
+        self.achievements = 0
+
+    def add(self, row, sign=1):
+        """Apply one (image_path, predicted_class, confidence, ..., eco_score, rules_version, timestamp) row, or remove it with sign=-1"""
+        _, predicted_class, confidence, _, recyclable, _, eco_score, _, _ = row
+        self.total += sign
+        if recyclable is not None:
+            if recyclable:
+                self.recyclable_count += sign
+            else:
+                self.non_recyclable_count += sign
+        if confidence is not None:
+            self.confidence_sum += sign * confidence
+            self.confidence_count += sign
+        if eco_score is not None:
+            self.eco_score_sum += sign * eco_score
+            self.eco_score_count += sign
+        self.by_category[predicted_class] = self.by_category.get(predicted_class, 0) + sign
+        if not self.by_category[predicted_class]:
+            del self.by_category[predicted_class]
+
+    def copy(self):
+        totals = PendingTotals()
+        totals.__dict__.update(self.__dict__, by_category=dict(self.by_category))
+        return totals
+
+
+class WriteBehindWriter:
+    """
+    Write-behind persistence for classifications and achievement unlocks.
+    Requests queue their rows and return; a background thread commits them in
+    batches of up to batch_size, at least every flush_interval_ms. Achievement
+    unlocks are decided from an in-memory classification count (resynced from
+    the database after every batch) instead of querying per request, and
+    statistics include rows that are still queued. When the queue is full the
+    write happens inline, which bounds memory. Queued rows are flushed at exit
+    and on SIGTERM. A batch that still fails after max_retries retries is
+    dropped (and logged) so shutdown can't hang on a broken database.
+
+    Commits happen outside the lock that request threads take. Each batch
+    records its number in the database in the same transaction, which lets
+    get_statistics() tell a committed batch from a queued one without
+    blocking on the commit.
+    """
+
+    def __init__(self, db, batch_size=100, flush_interval_ms=200, max_pending=10000, max_retries=5):
+        self.db = db
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000
+        self.max_retries = max(0, int(max_retries))
+        self.writer_id = uuid.uuid4().hex
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._worker = None
+        self._closed = False
+        self._total = 0
+        self._unlocked = set()
+        self._pending = PendingTotals()
+        self._pending_unlocks = []
+        # Number of the last batch handed to the database, and the deltas of the one being committed
+        self._batch = 0
+        self._in_flight = None
+        self.queued = 0
+        self.written = 0
+        self.inline_writes = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+        self.dropped_rows = 0
+        atexit.register(self.close)
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                # Seed the in-memory counter once; rows written by other processes are picked up after each batch
+                total, unlocked = self.db.achievement_state()
+                with self._lock:
+                    self._total += total
+                    self._unlocked |= unlocked
+                self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._worker.start()
+
+    def install_signal_handler(self):
+        """Flush on SIGTERM before exiting (only possible from the main thread)"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle(signum, frame):
+            if callable(previous):
+                self.close()
+                previous(signum, frame)
+            else:
+                # Unwind the main thread; the atexit hook flushes the queue
+                sys.exit(0)
+
+        signal.signal(signal.SIGTERM, handle)
+
+    def _enqueue(self, item):
+        """Queue an item; False if the queue is full or the writer is closed"""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def save_classification(self, image_path, predicted_class, confidence, all_predictions,
+                            recyclable=None, recyclable_confidence=None, eco_score=None, rules_version=None):
+        """Queue a classification (same arguments as Database.save_classification)"""
+        self._ensure_worker()
+        # SQLite's CURRENT_TIMESTAMP format, taken now so the row keeps the request time
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        row = (image_path, predicted_class, confidence, all_predictions,
+               recyclable, recyclable_confidence, eco_score, rules_version, timestamp)
+        with self._lock:
+            queued = self._enqueue(('classification', row))
+            self._total += 1
+            if queued:
+                self._pending.add(row)
+                self.queued += 1
+        if not queued:
+            self.db.save_batch([row])
+            self.inline_writes += 1
+
+    def check_achievements(self):
+        """Unlock achievements from the in-memory count; the unlocks are persisted with the next batch"""
+        self._ensure_worker()
+        new_achievements = []
+        inline_unlocks = []
+        with self._lock:
+            for ach_id, name, desc, required in ACHIEVEMENTS:
+                if self._total >= required and ach_id not in self._unlocked:
+                    self._unlocked.add(ach_id)
+                    unlock = (ach_id, name, desc, datetime.now())
+                    if self._enqueue(('achievement', unlock)):
+                        self._pending_unlocks.append(unlock)
+                        self._pending.achievements += 1
+                    else:
+                        inline_unlocks.append(unlock)
+                    new_achievements.append({'id': ach_id, 'name': name, 'description': desc})
+        if inline_unlocks:
+            self.db.save_batch([], inline_unlocks)
+        return new_achievements
+
+    def get_statistics(self):
+        """Database statistics plus everything still queued"""
+        self._ensure_worker()
+        for _ in range(3):
+            with self._lock:
+                pending, in_flight, last_batch = self._pending.copy(), self._in_flight, self._batch
+
+            def overlay(committed):
+                if committed > last_batch:
+                    raise _StaleSnapshot()
+                return self._uncommitted(pending, in_flight, committed)
+
+            try:
+                return self.db.get_statistics(pending=overlay, writer=self.writer_id)
+            except _StaleSnapshot:
+                continue
+        # Batches keep committing under the optimistic read: hold the lock so no new batch can start
+        with self._lock:
+            pending, in_flight = self._pending.copy(), self._in_flight
+            return self.db.get_statistics(pending=lambda committed: self._uncommitted(pending, in_flight, committed),
+                                          writer=self.writer_id)
+
+    @staticmethod
+    def _uncommitted(pending, in_flight, committed):
+        """Pending deltas minus the in-flight batch if the database already has it (batches commit in order)"""
+        if in_flight is not None and committed >= in_flight[0]:
+            _, rows, unlocks = in_flight
+            for row in rows:
+                pending.add(row, sign=-1)
+            pending.achievements -= len(unlocks)
+        return pending
+
+    def get_achievements(self):
+        """Unlocked achievements, including unlocks that are still queued"""
+        # Snapshot before reading, so an unlock committed meanwhile shows up in one of the two
+        with self._lock:
+            pending_unlocks = list(self._pending_unlocks)
+        achievements = self.db.get_achievements()
+        stored = {achievement['id'] for achievement in achievements}
+        pending = [{'id': ach_id, 'name': name, 'description': desc, 'unlocked_at': str(unlocked_at)}
+                   for ach_id, name, desc, unlocked_at in reversed(pending_unlocks) if ach_id not in stored]
+        return pending + achievements
+
+    def _next_batch(self):
+        """Block for the first item, then gather more until the batch is full or the interval is up"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not _FLUSH and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _retire(self, rows, unlocks):
+        """Remove committed (or dropped) items from the pending deltas; call with the lock held"""
+        for row in rows:
+            self._pending.add(row, sign=-1)
+        self._pending.achievements -= len(unlocks)
+        del self._pending_unlocks[:len(unlocks)]
+        self._in_flight = None
+
+    def _write(self, items):
+        rows = [payload for kind, payload in items if kind == 'classification']
+        unlocks = [payload for kind, payload in items if kind == 'achievement']
+        with self._lock:
+            self._batch += 1
+            batch = self._batch
+            self._in_flight = (batch, rows, unlocks)
+        # The commit (which may wait on busy_timeout) runs without the lock request threads need
+        try:
+            total, unlocked = self.db.save_batch(rows, unlocks, progress=(self.writer_id, batch))
+        except BaseException:
+            with self._lock:
+                self._in_flight = None
+            raise
+        with self._lock:
+            self._retire(rows, unlocks)
+            # Resync with the database so other processes' classifications count towards achievements
+            self._total = total + self._pending.total
+            self._unlocked |= unlocked
+            self.written += len(rows)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(rows))
+
+    def _drop(self, items):
+        """Give up on a batch: stop counting it as pending and let its achievements unlock again"""
+        rows = [payload for kind, payload in items if kind == 'classification']
+        unlocks = [payload for kind, payload in items if kind == 'achievement']
+        with self._lock:
+            self._retire(rows, unlocks)
+            self._total -= len(rows)
+            self._unlocked -= {unlock[0] for unlock in unlocks}
+            self.dropped_rows += len(rows)
+        logger.error('Write-behind dropped %d classifications and %d achievement unlocks after %d retries: %r',
+                     len(rows), len(unlocks), self.max_retries, rows)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            items = [item for item in batch if item is not _FLUSH]
+            try:
+                attempt = 0
+                while items:
+                    try:
+                        self._write(items)
+                        break
+                    except Exception:
+                        # Keep the batch and retry; the rows stay counted as pending meanwhile
+                        self.failed_batches += 1
+                        if attempt >= self.max_retries:
+                            self._drop(items)
+                            break
+                        attempt += 1
+                        logger.warning('Write-behind batch of %d failed (attempt %d of %d), retrying',
+                                       len(items), attempt, self.max_retries + 1, exc_info=True)
+                        time.sleep(max(self.flush_interval, 0.1) * attempt)
+            except Exception:
+                # Never let the worker die: later writes would only pile up as pending
+                logger.exception('Write-behind worker error')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Block until everything queued so far is committed (or dropped)"""
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+    def close(self):
+        """Stop queueing (later writes go straight to the database) and flush what's queued"""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        if self._worker is not None:
+            try:
+                self.db.forget_write_behind_progress(self.writer_id)
+            except sqlite3.Error:
+                logger.warning('Could not remove write-behind progress for %s', self.writer_id, exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batch_size': self.batch_size,
+                'flush_interval_ms': round(self.flush_interval * 1000, 2),
+                'pending': self._queue.qsize(),
+                'queued': self.queued,
+                'written': self.written,
+                'inline_writes': self.inline_writes,
+                'batches': self.batches,
+                'avg_batch_size': round(self.written / self.batches, 2) if self.batches else 0,
+                'largest_batch': self.largest_batch,
+                'failed_batches': self.failed_batches,
+                'dropped_rows': self.dropped_rows,
+                'in_memory_total': self._total
+            }